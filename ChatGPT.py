@@ -2,7 +2,13 @@ import pygame
 import sys
 import random
 import math
+import bisect
+import heapq
 from pygame.locals import *
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # =======================
 #       CONSTANTS
@@ -54,11 +60,13 @@ MARINE_SHOOT_COOLDOWN = 0.5
 PROJECTILE_SPEED = 300        
 PROJECTILE_DAMAGE = 15        
 SCV_ATTACK_DAMAGE = 5         
+RETREAT_HEALTH = 15           # Player SCVs below this much health go back to the Command Center to heal
 
 # Engagement & separation settings
 ENGAGEMENT_RADIUS = 200       
 SEPARATION_DISTANCE = 15      
 SEPARATION_FORCE = 20         
+SEPARATION_NUMPY_UNITS = 400  # Armies this big find close pairs with NumPy, when it's installed
 
 # Turret settings
 TURRET_SHOOT_INTERVAL = 1.0  
@@ -155,7 +163,7 @@ class Building:
                 target = game.find_priority_target_for_turret(self)
                 if target:
                     proj = Projectile(self.x, self.y, target, TURRET_PROJECTILE_SPEED, TURRET_PROJECTILE_DAMAGE, self.owner)
-                    game.projectiles.append(proj)
+                    game.projectiles.add(proj)
                 self.turret_shoot_timer = 0
         # Bunker behavior using the new target function
         if self.complete and self.type == "Bunker":
@@ -164,7 +172,7 @@ class Building:
                 target = game.find_priority_target_for_bunker(self)
                 if target:
                     proj = Projectile(self.x, self.y, target, BUNKER_PROJECTILE_SPEED, BUNKER_PROJECTILE_DAMAGE, self.owner)
-                    game.projectiles.append(proj)
+                    game.projectiles.add(proj)
                 self.bunker_shoot_timer = 0
 
 class Unit:
@@ -182,7 +190,8 @@ class Unit:
             self.target_mineral = None
             self.deposit_target = None
             self.target_building = None
-            self.attack_target = None
+            self.target_enemy = None
+            self.shoot_timer = 0
             self.attack_timer = 0
             self.cargo = 0
         elif u_type == "Marine":
@@ -226,6 +235,136 @@ class Projectile:
             return True
         return False
 
+# =======================
+#    ENTITY STORAGE
+# =======================
+class EntityList:
+    """
+    Unordered list of game objects with O(1) removal.
+    remove() only tombstones an object (sets obj.removed) so it's safe to call while looping over the list.
+    compact() then takes the tombstoned objects out by moving the last object into their place.
+    Objects are their own handles: each one keeps its position in obj.index, and anything holding on to an
+    object can check obj.removed to see whether it's still in the game.
+    """
+    def __init__(self):
+        self.items = []
+        self.tombstones = []
+
+    def add(self, obj):
+        obj.removed = False
+        obj.index = len(self.items)
+        self.items.append(obj)
+        return obj
+
+    def remove(self, obj):
+        if obj.removed:
+            return False
+        obj.removed = True
+        self.tombstones.append(obj)
+        return True
+
+    def compact(self):
+        for obj in self.tombstones:
+            last = self.items.pop()
+            if last is not obj:
+                self.items[obj.index] = last
+                last.index = obj.index
+        self.tombstones = []
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items) - len(self.tombstones)
+
+# =======================
+#     SPATIAL INDEX
+# =======================
+class TargetGrid:
+    """
+    Uniform grid of units and buildings used for target selection.
+    Objects are bucketed by owner and target priority, and each bucket is split into square cells,
+    so a range query only looks at nearby cells and can stop at the first priority that has a target in range.
+    Units must call moved() whenever their position changes so the grid stays in sync.
+    """
+    def __init__(self, cell_size=ENGAGEMENT_RADIUS):
+        self.cell_size = cell_size
+        self.buckets = {}     # (owner, priority) -> {(cell_x, cell_y): {obj: None}}
+        self.counts = {}      # (owner, priority) -> number of objects in the bucket
+        self.priorities = []  # every priority seen so far, lowest (most important) first
+        self.where = {}       # obj -> ((owner, priority), cell)
+
+    def cell_of(self, x, y):
+        return (int(x // self.cell_size), int(y // self.cell_size))
+
+    def insert(self, obj, priority):
+        key = (obj.owner, priority)
+        cell = self.cell_of(obj.x, obj.y)
+        self.buckets.setdefault(key, {}).setdefault(cell, {})[obj] = None
+        self.counts[key] = self.counts.get(key, 0) + 1
+        if priority not in self.priorities:
+            self.priorities.append(priority)
+            self.priorities.sort()
+        self.where[obj] = (key, cell)
+
+    def remove(self, obj):
+        entry = self.where.pop(obj, None)
+        if entry is None:
+            return
+        key, cell = entry
+        cells = self.buckets[key]
+        del cells[cell][obj]
+        if not cells[cell]:
+            del cells[cell]
+        self.counts[key] -= 1
+
+    def moved(self, obj):
+        entry = self.where.get(obj)
+        if entry is None:
+            return
+        key, cell = entry
+        new_cell = self.cell_of(obj.x, obj.y)
+        if new_cell == cell:
+            return
+        cells = self.buckets[key]
+        del cells[cell][obj]
+        if not cells[cell]:
+            del cells[cell]
+        cells.setdefault(new_cell, {})[obj] = None
+        self.where[obj] = (key, new_cell)
+
+    def nearest(self, owner, priority, x, y, max_range):
+        """
+        Returns the closest object of the given owner and priority within max_range of (x, y), or None.
+        """
+        if not self.counts.get((owner, priority)):
+            return None
+        cells = self.buckets[(owner, priority)]
+        min_cx, min_cy = self.cell_of(x - max_range, y - max_range)
+        max_cx, max_cy = self.cell_of(x + max_range, y + max_range)
+        best = None
+        best_dist = max_range
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                for obj in cells.get((cx, cy), ()):
+                    dist = math.hypot(x - obj.x, y - obj.y)
+                    # Ties go to the oldest object so the choice doesn't depend on the order of the cells
+                    if dist < best_dist or (dist == best_dist and (best is None or obj.uid < best.uid)):
+                        best = obj
+                        best_dist = dist
+        return best
+
+    def find_target(self, owner, x, y, max_range):
+        """
+        Returns the highest priority object of the given owner within max_range of (x, y),
+        nearest first among equal priorities. Lower priority numbers are checked first.
+        """
+        for priority in self.priorities:
+            target = self.nearest(owner, priority, x, y, max_range)
+            if target is not None:
+                return target
+        return None
+
 # --- New helper functions for mineral generation ---
 
 def generate_center_minerals(center, count=15, radius=150):
@@ -289,14 +428,22 @@ def generate_corner_minerals_half_circle(corner, count=9, start_offset=100, arc_
 # =======================
 class Game:
     def __init__(self):
-        self.buildings = []
-        self.units = []
-        self.projectiles = []
+        self.buildings = EntityList()
+        self.units = EntityList()
+        self.projectiles = EntityList()
         self.resources = {"player": 1000, "enemy": 50}
         self.game_over = False
         self.winner = None
         self.minerals = []
-        self.resource_drops = []
+        self.resource_drops = EntityList()
+        # Spatial index of every unit and building, used to pick attack targets
+        self.target_grid = TargetGrid()
+        # Indexes kept up to date as things are added, finish building and die, so counts and lookups
+        # don't have to go through every unit and building. Each list is in the order things were added.
+        self.units_by_kind = {}         # (owner, type) -> units
+        self.buildings_by_kind = {}     # (owner, type) -> buildings, complete or not
+        self.complete_buildings = {}    # (owner, type) -> complete buildings
+        self.building_counts = {"player": 0, "enemy": 0}
         self.enemy_attack_timer = 0
         self.elapsed_time = 0
         self.enemy_attack_stage = 0
@@ -314,7 +461,41 @@ class Game:
 
 
     def count_units(self, owner, unit_type):
-        return sum(1 for u in self.units if u.owner == owner and u.type == unit_type)
+        return len(self.units_by_kind.get((owner, unit_type), ()))
+
+    def count_buildings(self, owner, b_type):
+        return len(self.buildings_by_kind.get((owner, b_type), ()))
+
+    def units_of(self, owners, unit_types):
+        """
+        Returns the units belonging to any of the owners with any of the types, in the order they were added.
+        """
+        groups = [self.units_by_kind.get((owner, unit_type), ()) for owner in owners for unit_type in unit_types]
+        return heapq.merge(*groups, key=lambda u: u.uid)
+
+    def building_completed(self, b):
+        # Complete buildings are kept in the order they were added, which is the order get_building finds them in
+        complete = self.complete_buildings.setdefault((b.owner, b.type), [])
+        complete.insert(bisect.bisect(complete, b.uid, key=lambda other: other.uid), b)
+
+    def kill(self, obj):
+        # Tombstones a destroyed unit or building and takes it out of every index straight away,
+        # it's dropped from its list when the lists are compacted at the end of the frame
+        if isinstance(obj, Unit):
+            if not self.units.remove(obj):
+                return
+            self.units_by_kind[(obj.owner, obj.type)].remove(obj)
+            # Free up its place at the mineral it was mining
+            if obj.type == "SCV" and obj.target_mineral and obj in obj.target_mineral.mining_scvs:
+                obj.target_mineral.mining_scvs.remove(obj)
+        else:
+            if not self.buildings.remove(obj):
+                return
+            self.buildings_by_kind[(obj.owner, obj.type)].remove(obj)
+            if obj.complete:
+                self.complete_buildings[(obj.owner, obj.type)].remove(obj)
+            self.building_counts[obj.owner] -= 1
+        self.target_grid.remove(obj)
 
     def add_building(self, b_type, x, y, owner, complete=False):
         # Determine grid dimension (default is 1 if not found)
@@ -324,12 +505,19 @@ class Game:
         grid_y = round(y / TILE_SIZE) * TILE_SIZE
         b = Building(b_type, grid_x, grid_y, owner, complete)
         b.grid_dim = grid_dim  # store the grid dimension for later (e.g. collision, scaling)
-        self.buildings.append(b)
+        self.buildings.add(b)
+        self.buildings_by_kind.setdefault((owner, b_type), []).append(b)
+        self.building_counts[owner] += 1
+        if complete:
+            self.building_completed(b)
+        self.target_grid.insert(b, self.get_target_priority(b))
         return b
 
     def add_unit(self, u_type, x, y, owner):
         u = Unit(u_type, x, y, owner)
-        self.units.append(u)
+        self.units.add(u)
+        self.units_by_kind.setdefault((owner, u_type), []).append(u)
+        self.target_grid.insert(u, self.get_target_priority(u))
         return u
 
     def add_production_order(self, building):
@@ -406,6 +594,7 @@ class Game:
         else:
             unit.x += (dx / dist) * move_dist
             unit.y += (dy / dist) * move_dist
+        self.target_grid.moved(unit)
 
     def get_target_priority(self, target):
         """
@@ -433,40 +622,15 @@ class Game:
 
 
     def find_priority_target(self, attacker, enemy_owner="enemy", max_range=100):
-        # 1) Gather all valid targets in range (units + buildings)
-        all_targets = []
-
-        # Collect enemy units in range
-        for u in self.units:
-            if u.owner == enemy_owner:
-                dist = math.hypot(attacker.x - u.x, attacker.y - u.y)
-                if dist <= max_range:
-                    prio = self.get_target_priority(u)
-                    all_targets.append((u, prio, dist))
-
-        # Collect enemy buildings in range
-        for b in self.buildings:
-            if b.owner == enemy_owner:
-                dist = math.hypot(attacker.x - b.x, attacker.y - b.y)
-                if dist <= max_range:
-                    prio = self.get_target_priority(b)
-                    all_targets.append((b, prio, dist))
-
-        # 2) If no targets in range, return None
-        if not all_targets:
-            return None
-
-        # 3) Sort by (priority asc, distance asc)
-        #    i.e. kill "priority 1" first, then 2, and so on
-        all_targets.sort(key=lambda tup: (tup[1], tup[2]))
-
-        # 4) Return the best target
-        return all_targets[0][0]
+        # Kill "priority 1" first, then 2, and so on, picking the closest target within a priority.
+        # The grid only looks at cells within range and stops at the first priority with a target,
+        # so there's no need to check every unit and building or sort them.
+        return self.target_grid.find_target(enemy_owner, attacker.x, attacker.y, max_range)
 
 
     def update_attack_state(self, unit, dt):
         # If the current target exists and is still alive…
-        if unit.target_enemy and unit.target_enemy.health > 0:
+        if unit.target_enemy and not unit.target_enemy.removed:
             dist = math.hypot(unit.x - unit.target_enemy.x, unit.y - unit.target_enemy.y)
             if dist <= ENGAGEMENT_RADIUS:
                 # In-range: perform attack (your existing code for shooting goes here)
@@ -476,7 +640,7 @@ class Game:
                     if unit.owner == "player":
                         damage = int(PROJECTILE_DAMAGE * player_damage_multiplier)
                     proj = Projectile(unit.x, unit.y, unit.target_enemy, PROJECTILE_SPEED, damage, unit.owner)
-                    self.projectiles.append(proj)
+                    self.projectiles.add(proj)
                     unit.shoot_timer = 0
             else:
                 # Out-of-range: continue moving toward the target.
@@ -498,28 +662,146 @@ class Game:
                 unit.state = "attack_move"
 
     def apply_separation(self, dt):
-        combat_units = [u for u in self.units if u.type in ["Marine", "Tank", "Wraith"]]
+        combat_units = list(self.units_of(["player", "enemy"], ["Marine", "Tank", "Wraith"]))
+        if np is not None and len(combat_units) >= SEPARATION_NUMPY_UNITS:
+            pairs = self.separation_pairs_numpy(combat_units, dt)
+        else:
+            pairs = self.separation_pairs(combat_units)
+        # Pairs are pushed apart one after another in list order, each seeing the positions earlier pushes left,
+        # the same as checking every pair would.
+        pushed = set()
+        for i, j in pairs:
+            u1 = combat_units[i]
+            u2 = combat_units[j]
+            dx = u1.x - u2.x
+            dy = u1.y - u2.y
+            dist = math.hypot(dx, dy)
+            if dist < SEPARATION_DISTANCE and dist > 0:
+                overlap = SEPARATION_DISTANCE - dist
+                nx = dx / dist
+                ny = dy / dist
+                u1.x += nx * SEPARATION_FORCE * dt * (overlap / SEPARATION_DISTANCE)
+                u1.y += ny * SEPARATION_FORCE * dt * (overlap / SEPARATION_DISTANCE)
+                u2.x -= nx * SEPARATION_FORCE * dt * (overlap / SEPARATION_DISTANCE)
+                u2.y -= ny * SEPARATION_FORCE * dt * (overlap / SEPARATION_DISTANCE)
+                pushed.add(u1)
+                pushed.add(u2)
+        for u in pushed:
+            self.target_grid.moved(u)
+
+    def separation_pairs(self, combat_units):
+        """
+        Yields the (i, j) index pairs of combat units that may be too close, with i < j, in the order
+        a double loop over the list would visit them.
+        Units are kept in a grid with cells SEPARATION_DISTANCE wide, so only units in the same or an
+        adjacent cell can be close enough and every other pair is skipped without measuring it.
+        The caller pushes each pair apart before asking for the next one, so the grid is updated as units
+        change cells and no pair that a push brings into range is missed.
+        """
+        cells = {}
+        unit_cells = []
+        for index, u in enumerate(combat_units):
+            cell = (int(u.x // SEPARATION_DISTANCE), int(u.y // SEPARATION_DISTANCE))
+            cells.setdefault(cell, []).append(index)
+            unit_cells.append(cell)
+
+        def neighbors(cell, after):
+            cx, cy = cell
+            found = []
+            for ox in (-1, 0, 1):
+                for oy in (-1, 0, 1):
+                    for j in cells.get((cx + ox, cy + oy), ()):
+                        if j > after:
+                            found.append(j)
+            found.sort()
+            return found
+
         for i in range(len(combat_units)):
-            for j in range(i+1, len(combat_units)):
-                u1 = combat_units[i]
-                u2 = combat_units[j]
-                dx = u1.x - u2.x
-                dy = u1.y - u2.y
-                dist = math.hypot(dx, dy)
-                if dist < SEPARATION_DISTANCE and dist > 0:
-                    overlap = SEPARATION_DISTANCE - dist
-                    nx = dx / dist
-                    ny = dy / dist
-                    u1.x += nx * SEPARATION_FORCE * dt * (overlap / SEPARATION_DISTANCE)
-                    u1.y += ny * SEPARATION_FORCE * dt * (overlap / SEPARATION_DISTANCE)
-                    u2.x -= nx * SEPARATION_FORCE * dt * (overlap / SEPARATION_DISTANCE)
-                    u2.y -= ny * SEPARATION_FORCE * dt * (overlap / SEPARATION_DISTANCE)
+            cell = unit_cells[i]
+            candidates = neighbors(cell, i)
+            k = 0
+            while k < len(candidates):
+                j = candidates[k]
+                k += 1
+                yield i, j
+                for index in (i, j):
+                    u = combat_units[index]
+                    new_cell = (int(u.x // SEPARATION_DISTANCE), int(u.y // SEPARATION_DISTANCE))
+                    if new_cell != unit_cells[index]:
+                        cells[unit_cells[index]].remove(index)
+                        cells.setdefault(new_cell, []).append(index)
+                        unit_cells[index] = new_cell
+                # Unit i was pushed into another cell, so its remaining neighbors are looked up again from there
+                if unit_cells[i] != cell:
+                    cell = unit_cells[i]
+                    candidates = neighbors(cell, j)
+                    k = 0
+
+    def separation_pairs_numpy(self, combat_units, dt):
+        """
+        Same as separation_pairs, with the grid lookups done by NumPy for very large armies.
+        The pairs are all found up front from the positions at the start of the frame, keeping every pair that
+        starts within twice the separation distance. A unit is only pushed by pairs in that list, each push moving
+        it at most SEPARATION_FORCE * dt, so if no unit is in enough pairs to drift half the separation distance
+        no other pair can get in range and the list has every pair the grid version would give. Crowds too dense
+        or frames too long for that use the grid version instead.
+        """
+        count = len(combat_units)
+        xs = np.fromiter((u.x for u in combat_units), float, count)
+        ys = np.fromiter((u.y for u in combat_units), float, count)
+        first, second = self.close_pairs_numpy(xs, ys, SEPARATION_DISTANCE * 2)
+        if len(first) == 0:
+            return []
+        pushes = int(np.bincount(np.concatenate((first, second)), minlength=count).max())
+        if 2 * pushes * SEPARATION_FORCE * dt >= SEPARATION_DISTANCE:
+            return self.separation_pairs(combat_units)
+        visit = np.lexsort((second, first))
+        return list(zip(first[visit].tolist(), second[visit].tolist()))
+
+    def close_pairs_numpy(self, xs, ys, radius):
+        """
+        Returns the index arrays (first, second) of every pair of positions closer than radius, with first < second.
+        Positions are sorted into cells radius wide, and every one looks up the range of positions in each
+        of its 9 neighboring cells.
+        """
+        count = len(xs)
+        cxs = np.floor(xs / radius).astype(np.int64)
+        cys = np.floor(ys / radius).astype(np.int64)
+        # One number per cell, with room for the neighboring rows and columns around the world
+        stride = int(cys.max() - cys.min()) + 3
+        keys = (cxs - cxs.min() + 1) * stride + (cys - cys.min() + 1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        firsts = []
+        seconds = []
+        for ox in (-1, 0, 1):
+            for oy in (-1, 0, 1):
+                neighbor_keys = keys + ox * stride + oy
+                starts = np.searchsorted(sorted_keys, neighbor_keys, "left")
+                ends = np.searchsorted(sorted_keys, neighbor_keys, "right")
+                lengths = ends - starts
+                total = int(lengths.sum())
+                if total == 0:
+                    continue
+                # Expand each position's range of sorted positions into one entry per neighbor
+                first = np.repeat(np.arange(count), lengths)
+                offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+                second = order[np.repeat(starts, lengths) + offsets]
+                keep = second > first
+                firsts.append(first[keep])
+                seconds.append(second[keep])
+        if not firsts:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        first = np.concatenate(firsts)
+        second = np.concatenate(seconds)
+        close = np.hypot(xs[first] - xs[second], ys[first] - ys[second]) < radius
+        return first[close], second[close]
 
     def update_enemy_building_requirements(self):
         enemy_scv = self.count_units("enemy", "SCV")
-        enemy_barracks = len([b for b in self.buildings if b.owner == "enemy" and b.type == "Barracks"])
-        enemy_tank_factory = len([b for b in self.buildings if b.owner == "enemy" and b.type == "Tank Factory"])
-        enemy_wraith_factory = len([b for b in self.buildings if b.owner == "enemy" and b.type == "Wraith Factory"])
+        enemy_barracks = self.count_buildings("enemy", "Barracks")
+        enemy_tank_factory = self.count_buildings("enemy", "Tank Factory")
+        enemy_wraith_factory = self.count_buildings("enemy", "Wraith Factory")
         cc = self.get_building("Command Center", "enemy")
         if not cc:
             return
@@ -578,7 +860,7 @@ class Game:
         AI_AGGRESSIVENESS = min(1.0, self.elapsed_time / 300)
         
         enemy_scvs = self.count_units("enemy", "SCV")
-        enemy_marines = sum(1 for u in self.units if u.owner=="enemy" and u.type=="Marine")
+        enemy_marines = self.count_units("enemy", "Marine")
         cc = self.get_building("Command Center", "enemy")
         
         # Prioritize worker production when minerals are abundant or if SCVs are low.
@@ -590,7 +872,7 @@ class Game:
 
         self.update_enemy_building_requirements()
 
-        enemy_turrets = [b for b in self.buildings if b.owner=="enemy" and b.type=="Turret"]
+        enemy_turrets = self.count_buildings("enemy", "Turret")
         if cc and not enemy_turrets and self.resources["enemy"] >= COST_TURRET:
             bx, by = self.get_random_build_location(cc, radius=100, min_sep=20)
             self.add_building("Turret", bx, by, "enemy", complete=False)
@@ -621,37 +903,35 @@ class Game:
         cc = self.get_building("Command Center", "enemy")
 
         # Count total enemy combat units (Marines, Tanks, and Wraiths)
-        enemy_combat = sum(1 for u in self.units if u.owner == "enemy" and u.type in ["Marine", "Tank", "Wraith"])
+        enemy_combat = self.count_units("enemy", "Marine") + self.count_units("enemy", "Tank") + self.count_units("enemy", "Wraith")
 
         # If built-up forces are below the threshold, make them patrol near the enemy Command Center.
         if enemy_combat < self.enemy_attack_threshold and cc is not None:
-            for u in self.units:
-                if u.owner == "enemy" and u.type in ["Marine", "Tank", "Wraith"]:
-                    # Only change state if the unit is idle (or not already attacking/patrolling)
-                    if u.state not in ["patrolling", "attacking", "attack_move"]:
-                        u.state = "patrolling"
-                        # Set a random target within 100 pixels of the enemy CC
-                        u.move_target = (cc.x + random.randint(-100, 100), cc.y + random.randint(-100, 100))
+            for u in self.units_of(["enemy"], ["Marine", "Tank", "Wraith"]):
+                # Only change state if the unit is idle (or not already attacking/patrolling)
+                if u.state not in ["patrolling", "attacking", "attack_move"]:
+                    u.state = "patrolling"
+                    # Set a random target within 100 pixels of the enemy CC
+                    u.move_target = (cc.x + random.randint(-100, 100), cc.y + random.randint(-100, 100))
 
         # Attack only if there are at least 12 enemy Marines.
         # Count total enemy combat units (Marines, Tanks, and Wraiths).
-        enemy_combat = sum(1 for u in self.units if u.owner == "enemy" and u.type in ["Marine", "Tank", "Wraith"])
+        enemy_combat = self.count_units("enemy", "Marine") + self.count_units("enemy", "Tank") + self.count_units("enemy", "Wraith")
 
         # If the built-up forces meet or exceed the threshold and the attack timer allows an attack...
         if enemy_combat >= self.enemy_attack_threshold and self.enemy_attack_timer <= 0:
             print("Enemy AI: Launching attack wave!")
             self.enemy_attack_timer = ENEMY_ATTACK_COOLDOWN * (1 - AI_AGGRESSIVENESS * 0.5)
             # Order all enemy combat units to attack
-            for u in self.units:
-                if u.owner == "enemy" and u.type in ["Marine", "Tank", "Wraith"]:
-                    # Try to choose an optimal target according to our priority ordering with an extended range.
-                    target = self.find_priority_target(u, enemy_owner="player", max_range=ENGAGEMENT_RADIUS * 2)
-                    if not target:
-                        # Fall back to targeting the player's Command Center.
-                        target = self.get_building("Command Center", "player")
-                    if target:
-                        u.target_enemy = target
-                        u.state = "attacking"
+            for u in self.units_of(["enemy"], ["Marine", "Tank", "Wraith"]):
+                # Try to choose an optimal target according to our priority ordering with an extended range.
+                target = self.find_priority_target(u, enemy_owner="player", max_range=ENGAGEMENT_RADIUS * 2)
+                if not target:
+                    # Fall back to targeting the player's Command Center.
+                    target = self.get_building("Command Center", "player")
+                if target:
+                    u.target_enemy = target
+                    u.state = "attacking"
             # Increase the threshold for the next attack (adjust increment as desired)
             self.enemy_attack_threshold += random.randint(3, 7)
 
@@ -687,220 +967,176 @@ class Game:
             return
 
         for b in self.buildings:
+            was_complete = b.complete
             b.update(dt)
+            if b.complete and not was_complete:
+                self.building_completed(b)
             if b.production_queue is not None:
                 self.process_production(b, dt)
         self.update_enemy_ai(dt)
-        for p in self.projectiles[:]:
-            if p.update(dt):
+        for p in self.projectiles:
+            # The target was destroyed by something else first
+            if p.target.removed:
+                self.projectiles.remove(p)
+            elif p.update(dt):
                 p.target.health -= p.damage
+                if p.target.health <= 0:
+                    self.kill(p.target)
                 self.projectiles.remove(p)
+        self.projectiles.compact()
         self.apply_separation(dt)
         if random.random() < dt / 30:
             drop = ResourceDrop(random.randint(0, WORLD_WIDTH), random.randint(0, WORLD_HEIGHT), amount=100)
-            self.resource_drops.append(drop)
-        for drop in self.resource_drops[:]:
-            for u in self.units:
-                if u.owner == "player" and u.type == "SCV":
+            self.resource_drops.add(drop)
+        for drop in self.resource_drops:
+            for u in self.units_of(["player", "enemy"], ["SCV"]):
+                if u.owner == "player":
                     if math.hypot(u.x - drop.x, u.y - drop.y) < 10:
                         self.resources["player"] += drop.amount
                         self.resource_drops.remove(drop)
                         break
-                elif u.owner == "enemy" and u.type == "SCV":
+                elif u.owner == "enemy":
                     if math.hypot(u.x - drop.x, u.y - drop.y) < 10:
                         self.resources["enemy"] += drop.amount
                         self.resource_drops.remove(drop)
                         break
+        self.resource_drops.compact()
+        # Group the units by what they're doing and run each group through its behavior
+        batches = {}
         for u in self.units:
-            # ---- Player SCV Behavior ----
-            if u.type == "SCV" and u.owner == "player":
-                if u.health < 15 and u.state != "retreat":
-                    cc = self.get_building("Command Center", "player")
-                    if cc:
-                        u.state = "retreat"
-                        u.move_target = (cc.x, cc.y)
-                if u.state == "retreat":
-                    self.move_towards(u, u.move_target[0], u.move_target[1], dt)
-                    u.health += 2 * dt
-                    if u.health >= 50:
-                        u.health = 50
-                        u.state = "idle"
-                    continue
-                if u.state == "repairing":
-                    # Check if target_building is valid before moving toward it
-                    if u.target_building is not None:
-                        self.move_towards(u, u.target_building.x, u.target_building.y, dt)
-                        if math.hypot(u.x - u.target_building.x, u.y - u.target_building.y) < 5:
-                            u.target_building.health += 10 * dt
-                            if u.target_building.health >= u.target_building.max_health:
-                                u.target_building.health = u.target_building.max_health
-                                u.state = "idle"
-                                u.target_building = None
-                    else:
-                        # If there's no target building, switch SCV back to idle state.
-                        u.state = "idle"
-                    continue
-                if u.state == "building":
-                    self.move_towards(u, u.target_building.x, u.target_building.y, dt)
-                    continue
-                if u.state == "idle" and u.target_mineral is None:
-                    available = [m for m in self.minerals if m.amount > 0 and len(m.mining_scvs) < 3 and math.hypot(u.x - m.x, u.y - m.y) <= 800]
-                    if available:
-                        u.target_mineral = random.choice(available)
-                        u.target_mineral.mining_scvs.append(u)  # Register this SCV as mining
-                        u.state = "to_mineral"
-                if u.state == "moving" and u.move_target:
-                    self.move_towards(u, u.move_target[0], u.move_target[1], dt)
-                    if math.hypot(u.x - u.move_target[0], u.y - u.move_target[1]) < 5:
-                        u.state = "idle"
-                        u.move_target = None
-                if u.state == "to_mineral" and u.target_mineral:
-                    self.move_towards(u, u.target_mineral.x, u.target_mineral.y, dt)
-                    if math.hypot(u.x - u.target_mineral.x, u.y - u.target_mineral.y) < 5:
-                        u.state = "mining"
-                        u.mine_timer = 0
-                elif u.state == "mining":
-                    u.mine_timer += dt
-                    if u.mine_timer >= MINING_CYCLE:
-                        if u.target_mineral and u.target_mineral.amount > 0:
-                            u.target_mineral.amount -= MINING_YIELD
-                            u.cargo = MINING_YIELD
-                        u.mine_timer = 0
-                        # Remove this SCV from the mineral's mining list if present.
-                        if u.target_mineral and u in u.target_mineral.mining_scvs:
-                            u.target_mineral.mining_scvs.remove(u)
-                        u.target_mineral = None
-                        u.state = "to_depot"
-                elif u.state == "to_depot" and u.deposit_target:
-                    # Calculate the center of the deposit building (Command Center) using its grid dimension.
-                    depot_width = u.deposit_target.grid_dim * TILE_SIZE
-                    depot_height = u.deposit_target.grid_dim * TILE_SIZE
-                    depot_center = (u.deposit_target.x + depot_width/2, u.deposit_target.y + depot_height/2)
-                    self.move_towards(u, depot_center[0], depot_center[1], dt)
-                    # Create the building rectangle to detect collision.
-                    depot_rect = pygame.Rect(u.deposit_target.x, u.deposit_target.y, depot_width, depot_height)
-                    if depot_rect.collidepoint(u.x, u.y):
-                        self.resources["player"] += u.cargo
-                        u.cargo = 0
-                        if u.target_mineral and u.target_mineral.amount > 0:
-                            u.state = "to_mineral"
-                        else:
-                            u.state = "idle"
-
-                if u.state == "attack_move" and u.move_target:
-                    self.move_towards(u, u.move_target[0], u.move_target[1], dt)
-                    if not u.attack_target:
-                        u.attack_target = self.find_priority_target(u, enemy_owner="enemy", max_range=ENGAGEMENT_RADIUS)
-                    if u.attack_target:
-                        u.state = "attacking"
-                if u.state == "attacking":
-                    self.update_attack_state(u, dt)
-            # ---- Player Marine Behavior ----
-            if u.type == "Marine" and u.owner == "player":
-                if u.state == "moving" and u.move_target:
-                    self.move_towards(u, u.move_target[0], u.move_target[1], dt)
-                    if math.hypot(u.x - u.move_target[0], u.y - u.move_target[1]) < 5:
-                        u.state = "idle"
-                        u.move_target = None
-                if u.state == "attack_move" and u.move_target:
-                    self.move_towards(u, u.move_target[0], u.move_target[1], dt)
-                    if not u.target_enemy:
-                        u.target_enemy = self.find_priority_target(u, enemy_owner="enemy", max_range=ENGAGEMENT_RADIUS)
-                    if u.target_enemy:
-                        u.state = "attacking"
-                if u.state == "attacking":
-                    self.update_attack_state(u, dt)
-            # ---- Player Tank and Wraith Behavior ----
-            if u.type in ["Tank", "Wraith"] and u.owner == "player":
-                if u.state == "moving" and u.move_target:
-                    self.move_towards(u, u.move_target[0], u.move_target[1], dt)
-                    if math.hypot(u.x - u.move_target[0], u.y - u.move_target[1]) < 5:
-                        u.state = "idle"
-                        u.move_target = None
-                if u.state == "attack_move" and u.move_target:
-                    self.move_towards(u, u.move_target[0], u.move_target[1], dt)
-                    if not u.target_enemy:
-                        u.target_enemy = self.find_priority_target(u, enemy_owner="enemy", max_range=ENGAGEMENT_RADIUS)
-                    if u.target_enemy:
-                        u.state = "attacking"
-                if u.state == "attacking":
-                    self.update_attack_state(u, dt)
-            # ---- Enemy SCV Behavior ----
-            if u.type == "SCV" and u.owner == "enemy":
-                if u.state == "idle" and u.target_mineral is None:
-                    available = [m for m in self.minerals if m.amount > 0 and len(m.mining_scvs) < 3 and math.hypot(u.x - m.x, u.y - m.y) <= 800]
-                    if available:
-                        u.target_mineral = random.choice(available)
-                        u.target_mineral.mining_scvs.append(u)  # Register this SCV as mining
-                        u.state = "to_mineral"
-                if u.state == "moving" and u.move_target:
-                    self.move_towards(u, u.move_target[0], u.move_target[1], dt)
-                    if math.hypot(u.x - u.move_target[0], u.y - u.move_target[1]) < 5:
-                        u.state = "idle"
-                        u.move_target = None
-                    continue
-                if u.state == "to_mineral" and u.target_mineral:
-                    self.move_towards(u, u.target_mineral.x, u.target_mineral.y, dt)
-                    if math.hypot(u.x - u.target_mineral.x, u.y - u.target_mineral.y) < 5:
-                        u.state = "mining"
-                        u.mine_timer = 0
-                elif u.state == "mining":
-                    u.mine_timer += dt
-                    if u.mine_timer >= MINING_CYCLE:
-                        if u.target_mineral and u.target_mineral.amount > 0:
-                            u.target_mineral.amount -= MINING_YIELD
-                            u.cargo = MINING_YIELD
-                        u.mine_timer = 0
-                        # Remove this SCV from the mineral's mining list if present.
-                        if u.target_mineral and u in u.target_mineral.mining_scvs:
-                            u.target_mineral.mining_scvs.remove(u)
-                        u.target_mineral = None
-                        u.state = "to_depot"
-
-                elif u.state == "to_depot" and u.deposit_target:
-                    # Calculate the center of the deposit building (Command Center) using its grid dimension.
-                    depot_width = u.deposit_target.grid_dim * TILE_SIZE
-                    depot_height = u.deposit_target.grid_dim * TILE_SIZE
-                    depot_center = (u.deposit_target.x + depot_width/2, u.deposit_target.y + depot_height/2)
-                    self.move_towards(u, depot_center[0], depot_center[1], dt)
-                    # Create the building rectangle to detect collision.
-                    depot_rect = pygame.Rect(u.deposit_target.x, u.deposit_target.y, depot_width, depot_height)
-                    if depot_rect.collidepoint(u.x, u.y):
-                        self.resources["enemy"] += u.cargo
-                        u.cargo = 0
-                        if u.target_mineral and u.target_mineral.amount > 0:
-                            u.state = "to_mineral"
-                        else:
-                            u.state = "idle"
-
-            # ---- Enemy Combat Units Behavior ----
-            if u.type in ["Marine", "Tank", "Wraith"] and u.owner == "enemy":
-                if u.state == "idle":
-                    target = self.find_priority_target(u, enemy_owner="player", max_range=ENGAGEMENT_RADIUS)
-                    if target is None:
-                        target = self.get_building("Command Center", "player")
-                    if target:
-                        u.state = "attacking"
-                        u.target_enemy = target
-                if u.state == "attack_move" and u.move_target:
-                    self.move_towards(u, u.move_target[0], u.move_target[1], dt)
-                if u.state == "attacking":
-                    self.update_attack_state(u, dt)
-        self.units = [u for u in self.units if u.health > 0]
-        self.buildings = [b for b in self.buildings if b.health > 0]
-        player_buildings = [b for b in self.buildings if b.owner=="player"]
-        enemy_buildings = [b for b in self.buildings if b.owner=="enemy"]
-        if not player_buildings:
+            # Destroyed this frame, waiting to be compacted away
+            if u.removed:
+                continue
+            if u.type in OWNER_BEHAVIOR[u.owner]["retreat_types"] and u.health < RETREAT_HEALTH and u.state != "retreat":
+                cc = self.get_building("Command Center", u.owner)
+                if cc:
+                    u.state = "retreat"
+                    u.move_target = (cc.x, cc.y)
+            batches.setdefault((u.type, u.state), []).append(u)
+        for key, units in batches.items():
+            behavior = UNIT_BEHAVIORS.get(key)
+            if behavior is not None:
+                for u in units:
+                    behavior(self, u, dt)
+        self.units.compact()
+        self.buildings.compact()
+        if not self.building_counts["player"]:
             self.game_over = True
             self.winner = "Enemy"
-        if not enemy_buildings:
+        if not self.building_counts["enemy"]:
             self.game_over = True
             self.winner = "Player"
 
+    # --- Unit behaviors: one method per state, looked up by (unit type, state) in UNIT_BEHAVIORS.
+    # Player and enemy units share them, what differs between the two sides is in OWNER_BEHAVIOR.
+    # When a unit switches to a state it should carry on with in the same frame, the method calls the next one itself.
+    def unit_retreat(self, u, dt):
+        self.move_towards(u, u.move_target[0], u.move_target[1], dt)
+        u.health += 2 * dt
+        if u.health >= 50:
+            u.health = 50
+            u.state = "idle"
+
+    def unit_repair(self, u, dt):
+        # Check if target_building is valid before moving toward it
+        if u.target_building is not None:
+            self.move_towards(u, u.target_building.x, u.target_building.y, dt)
+            if math.hypot(u.x - u.target_building.x, u.y - u.target_building.y) < 5:
+                u.target_building.health += 10 * dt
+                if u.target_building.health >= u.target_building.max_health:
+                    u.target_building.health = u.target_building.max_health
+                    u.state = "idle"
+                    u.target_building = None
+        else:
+            # If there's no target building, switch SCV back to idle state.
+            u.state = "idle"
+
+    def unit_build(self, u, dt):
+        self.move_towards(u, u.target_building.x, u.target_building.y, dt)
+
+    def unit_find_mineral(self, u, dt):
+        if u.target_mineral is None:
+            available = [m for m in self.minerals if m.amount > 0 and len(m.mining_scvs) < 3 and math.hypot(u.x - m.x, u.y - m.y) <= 800]
+            if available:
+                u.target_mineral = random.choice(available)
+                u.target_mineral.mining_scvs.append(u)  # Register this SCV as mining
+                u.state = "to_mineral"
+                self.unit_to_mineral(u, dt)
+
+    def unit_move(self, u, dt):
+        if u.move_target:
+            self.move_towards(u, u.move_target[0], u.move_target[1], dt)
+            if math.hypot(u.x - u.move_target[0], u.y - u.move_target[1]) < 5:
+                u.state = "idle"
+                u.move_target = None
+
+    def unit_to_mineral(self, u, dt):
+        if u.target_mineral:
+            self.move_towards(u, u.target_mineral.x, u.target_mineral.y, dt)
+            if math.hypot(u.x - u.target_mineral.x, u.y - u.target_mineral.y) < 5:
+                u.state = "mining"
+                u.mine_timer = 0
+
+    def unit_mine(self, u, dt):
+        u.mine_timer += dt
+        if u.mine_timer >= MINING_CYCLE:
+            if u.target_mineral and u.target_mineral.amount > 0:
+                u.target_mineral.amount -= MINING_YIELD
+                u.cargo = MINING_YIELD
+            u.mine_timer = 0
+            # Remove this SCV from the mineral's mining list if present.
+            if u.target_mineral and u in u.target_mineral.mining_scvs:
+                u.target_mineral.mining_scvs.remove(u)
+            u.target_mineral = None
+            u.state = "to_depot"
+
+    def unit_to_depot(self, u, dt):
+        if u.deposit_target:
+            # Calculate the center of the deposit building (Command Center) using its grid dimension.
+            depot_width = u.deposit_target.grid_dim * TILE_SIZE
+            depot_height = u.deposit_target.grid_dim * TILE_SIZE
+            depot_center = (u.deposit_target.x + depot_width/2, u.deposit_target.y + depot_height/2)
+            self.move_towards(u, depot_center[0], depot_center[1], dt)
+            # Create the building rectangle to detect collision.
+            depot_rect = pygame.Rect(u.deposit_target.x, u.deposit_target.y, depot_width, depot_height)
+            if depot_rect.collidepoint(u.x, u.y):
+                self.resources[u.owner] += u.cargo
+                u.cargo = 0
+                if u.target_mineral and u.target_mineral.amount > 0:
+                    u.state = "to_mineral"
+                else:
+                    u.state = "idle"
+
+    def unit_guard(self, u, dt):
+        # Idle units on a side that looks for a fight go after the closest target, or the other side's Command Center
+        if OWNER_BEHAVIOR[u.owner]["idle_attacks"]:
+            other_side = "enemy" if u.owner == "player" else "player"
+            target = self.find_priority_target(u, enemy_owner=other_side, max_range=ENGAGEMENT_RADIUS)
+            if target is None:
+                target = self.get_building("Command Center", other_side)
+            if target:
+                u.state = "attacking"
+                u.target_enemy = target
+                self.update_attack_state(u, dt)
+
+    def unit_attack_move(self, u, dt):
+        if u.move_target:
+            self.move_towards(u, u.move_target[0], u.move_target[1], dt)
+            if OWNER_BEHAVIOR[u.owner]["attack_move_acquires"]:
+                if not u.target_enemy:
+                    other_side = "enemy" if u.owner == "player" else "player"
+                    u.target_enemy = self.find_priority_target(u, enemy_owner=other_side, max_range=ENGAGEMENT_RADIUS)
+                if u.target_enemy:
+                    u.state = "attacking"
+                    self.update_attack_state(u, dt)
+
+    def unit_attack(self, u, dt):
+        self.update_attack_state(u, dt)
+
     def get_building(self, b_type, owner):
-        for b in self.buildings:
-            if b.type == b_type and b.owner == owner and b.complete:
-                return b
+        complete = self.complete_buildings.get((owner, b_type))
+        if complete:
+            return complete[0]
         return None
 
     def get_building_near(self, b_type, owner, pos, radius):
@@ -908,14 +1144,13 @@ class Game:
         Returns a building of type b_type owned by 'owner' that is within 'radius' pixels of pos.
         If no such building exists, return None.
         """
-        for b in self.buildings:
-            if b.type == b_type and b.owner == owner and b.complete:
-                # Calculate the center of the building using its grid dimensions.
-                b_width = b.grid_dim * TILE_SIZE
-                b_height = b.grid_dim * TILE_SIZE
-                b_center = (b.x + b_width / 2, b.y + b_height / 2)
-                if math.hypot(b_center[0] - pos[0], b_center[1] - pos[1]) <= radius:
-                    return b
+        for b in self.complete_buildings.get((owner, b_type), ()):
+            # Calculate the center of the building using its grid dimensions.
+            b_width = b.grid_dim * TILE_SIZE
+            b_height = b.grid_dim * TILE_SIZE
+            b_center = (b.x + b_width / 2, b.y + b_height / 2)
+            if math.hypot(b_center[0] - pos[0], b_center[1] - pos[1]) <= radius:
+                return b
         return None
 
 
@@ -932,6 +1167,37 @@ class Game:
         return self.find_priority_target(bunker, enemy_owner=target_owner, max_range=BUNKER_RANGE)
 
 
+# =======================
+#    UNIT BEHAVIORS
+# =======================
+# What a unit does each frame, looked up by (unit type, state). States without an entry (like an idle
+# player Marine or a patrolling enemy) do nothing.
+UNIT_BEHAVIORS = {
+    ("SCV", "retreat"): Game.unit_retreat,
+    ("SCV", "repairing"): Game.unit_repair,
+    ("SCV", "building"): Game.unit_build,
+    ("SCV", "idle"): Game.unit_find_mineral,
+    ("SCV", "moving"): Game.unit_move,
+    ("SCV", "to_mineral"): Game.unit_to_mineral,
+    ("SCV", "mining"): Game.unit_mine,
+    ("SCV", "to_depot"): Game.unit_to_depot,
+    ("SCV", "attack_move"): Game.unit_attack_move,
+    ("SCV", "attacking"): Game.unit_attack,
+}
+for combat_type in ["Marine", "Tank", "Wraith"]:
+    UNIT_BEHAVIORS[(combat_type, "idle")] = Game.unit_guard
+    UNIT_BEHAVIORS[(combat_type, "moving")] = Game.unit_move
+    UNIT_BEHAVIORS[(combat_type, "attack_move")] = Game.unit_attack_move
+    UNIT_BEHAVIORS[(combat_type, "attacking")] = Game.unit_attack
+
+# How the two sides' units differ
+OWNER_BEHAVIOR = {
+    # Hurt SCVs run back to the Command Center, and attack moves stop for anything in range
+    "player": {"retreat_types": ["SCV"], "idle_attacks": False, "attack_move_acquires": True},
+    # Idle units go looking for a fight, and attack moves just head for the spot
+    "enemy": {"retreat_types": [], "idle_attacks": True, "attack_move_acquires": False},
+}
+
 # =======================
 #    CONTROLS OVERLAY
 # =======================
@@ -0,0 +1,74 @@
+import os
+import struct
+import pygame
+from collections import OrderedDict
+from threading import Lock
+
+# Folder that holds every sprite the game uses
+IMAGE_DIR = "imgs"
+# How many scaled copies are kept before the least recently used ones are thrown away
+MAX_SCALED = 256
+
+# Every PNG starts with this, followed by the IHDR chunk that holds the width and height
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Width and height of each image, keyed by path
+sizes: dict[str, tuple[int, int]] = {}
+# Decoded images straight from disk, keyed by path
+images: dict[str, pygame.Surface] = {}
+# Resized copies of those images, keyed by (path, size) and ordered from oldest to newest use
+scaled: OrderedDict[tuple[str, tuple[int, int]], pygame.Surface] = OrderedDict()
+# Objects are built from both the network and render threads
+lock = Lock()
+
+# Decodes an image and converts it to the display's format when there is a display to convert to
+def load(path: str) -> pygame.Surface:
+    surface = pygame.image.load(path)
+    if pygame.display.get_surface() is not None:
+        surface = surface.convert_alpha()
+    return surface
+
+# The size of an image without decoding it, so game objects can be made without pygame surfaces
+def image_size(path: str) -> tuple[int, int]:
+    size = sizes.get(path)
+    if size is None and path in images:
+        size = sizes[path] = images[path].get_size()
+    if size is None:
+        with open(path, "rb") as file:
+            header = file.read(24)
+        if header[:8] == PNG_SIGNATURE and header[12:16] == b"IHDR":
+            size = struct.unpack("!II", header[16:24])
+        else:
+            size = get_image(path).get_size()
+        sizes[path] = size
+    return size
+
+# Returns the shared surface for a sprite, scaled to size if one is given
+def get_image(path: str, size: tuple[int, int] | None = None) -> pygame.Surface:
+    with lock:
+        image = images.get(path)
+        if image is None:
+            image = images[path] = load(path)
+        if size is None or size == image.get_size():
+            return image
+
+        key = (path, (int(size[0]), int(size[1])))
+        surface = scaled.get(key)
+        if surface is not None:
+            scaled.move_to_end(key)
+            return surface
+        surface = scaled[key] = pygame.transform.scale(image, key[1])
+        if len(scaled) > MAX_SCALED:
+            scaled.popitem(last=False)
+        return surface
+
+# Loads every image in the image folder so building game objects never has to read from disk
+def preload(directory: str = IMAGE_DIR):
+    with lock:
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".png"):
+                path = f"{directory}/{name}"
+                images[path] = load(path)
+                sizes[path] = images[path].get_size()
+        # Anything scaled before now may have come from an unconverted image
+        scaled.clear()
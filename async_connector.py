@@ -0,0 +1,215 @@
+import asyncio
+import socket
+import manager
+from collections import deque
+from threading import Thread
+from connector import HEADER, MAX_MESSAGE_SIZE, MessageReader, pack_message, RECV_SIZE
+
+PORT = 1212
+# How many frames can wait for a slow connection before the oldest ones are dropped
+MAX_PENDING = 8
+
+# The first message on every connection says whether the client plays or only watches
+PLAYER = b"player"
+SPECTATOR = b"spectator"
+
+# Start a server instance. The game only has two sides, the host plays p1 and the player who joins plays p2,
+# so only one other player can join. Anyone else has to spectate.
+def host_game(players: int = 1):
+    if players != 1:
+        raise ValueError("Only one other player can join a game")
+    return Server(players)
+
+# Start a client and connect it to the server
+def connect(ip, spectator: bool = False):
+    return Client(ip, spectator)
+
+# Hands a received message to the game
+def parse_message(connection, message: bytes):
+    manager.parse_data(message)
+
+# Reads a single message straight from a stream
+async def read_message(reader: asyncio.StreamReader) -> bytes:
+    (length,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if length > MAX_MESSAGE_SIZE:
+        raise ValueError(f"Message of {length} bytes is too large")
+    return await reader.readexactly(length)
+
+# One open connection with its own queue of frames waiting to be written
+class Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, on_message=parse_message, role: bytes = PLAYER):
+        self.reader = reader
+        self.writer = writer
+        self.on_message = on_message
+        self.role = role
+        # Every state frame replaces the one before it, so when the other side can't keep up
+        # the oldest waiting frames are thrown away instead of making the sender wait
+        self.pending: deque[bytes] = deque(maxlen=MAX_PENDING)
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.tasks = [asyncio.create_task(self.read_loop()), asyncio.create_task(self.write_loop())]
+
+    # Queue a message to be sent, never blocks
+    def queue(self, data: bytes):
+        self.queue_frame(pack_message(data))
+
+    # Queue a message that already has its length prefix, so one frame can go to many connections
+    def queue_frame(self, frame: bytes):
+        if not self.closed:
+            self.pending.append(frame)
+            self.ready.set()
+
+    # How many frames are waiting to be written
+    def queue_depth(self) -> int:
+        return len(self.pending)
+
+    # How many bytes are waiting, both in our queue and in the socket's write buffer
+    def buffered_bytes(self) -> int:
+        return sum(len(frame) for frame in self.pending) + self.writer.transport.get_write_buffer_size()
+
+    async def read_loop(self):
+        reader = MessageReader()
+        try:
+            while True:
+                data = await self.reader.read(RECV_SIZE)
+                if not data:
+                    break
+                for message in reader.feed(data):
+                    if message == b"close":
+                        return
+                    self.on_message(self, message)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.close()
+
+    async def write_loop(self):
+        try:
+            while not self.closed:
+                await self.ready.wait()
+                self.ready.clear()
+                if self.pending:
+                    frames = b"".join(self.pending)
+                    self.pending.clear()
+                    self.writer.write(frames)
+                # Wait here while the socket is backed up, newer frames keep replacing older ones meanwhile
+                await self.writer.drain()
+        except OSError:
+            self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.ready.set()
+            self.writer.close()
+
+class Client:
+    def __init__(self, ip, spectator: bool = False):
+        self.start_loop()
+        # Wait for the connection like the threaded client does
+        self.run(self.open(ip, SPECTATOR if spectator else PLAYER))
+        print("Connected to server")
+
+    # Run the event loop on its own thread so the game and pygame loops can keep running
+    def start_loop(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    # Run a coroutine on the event loop and wait for its result
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def open(self, ip, role: bytes):
+        reader, writer = await asyncio.open_connection(ip, PORT)
+        self.connection = Connection(reader, writer)
+        self.connection.queue(role)
+
+    def send(self, data: str | bytes):
+        if isinstance(data, str):
+            data = data.encode()
+        self.loop.call_soon_threadsafe(self.connection.queue, data)
+
+    def queue_depth(self) -> int:
+        return self.connection.queue_depth()
+
+    def buffered_bytes(self) -> int:
+        return self.connection.buffered_bytes()
+
+    async def shutdown(self):
+        self.connection.close()
+
+    def close(self):
+        if self.loop.is_running():
+            self.run(self.shutdown())
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+# Hosts the game for a number of players and any number of spectators
+class Server(Client):
+    def __init__(self, players: int = 1):
+        self.players = players
+        self.connections: list[Connection] = []
+        self.start_loop()
+
+        # Show some information before connecting the clients
+        hostname = socket.gethostname()
+        print(f"Your IP address is {socket.gethostbyname_ex(hostname)[-1][-1]}\n")
+
+        # Wait for every player to connect, spectators can keep joining after that
+        self.run(self.open_server())
+
+        print("All players connected")
+        self.send("All players connected")
+
+    async def open_server(self):
+        self.all_connected = self.loop.create_future()
+        self.server = await asyncio.start_server(self.on_connect, "0.0.0.0", PORT)
+        await self.all_connected
+
+    async def on_connect(self, reader, writer):
+        try:
+            role = await read_message(reader)
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            writer.close()
+            return
+        player_count = sum(1 for connection in self.connections if connection.role == PLAYER)
+        # Turn away extra players and anything that didn't introduce itself properly
+        if role not in (PLAYER, SPECTATOR) or (role == PLAYER and player_count >= self.players):
+            writer.close()
+            return
+        connection = Connection(reader, writer, self.on_message, role)
+        self.connections.append(connection)
+        connection.tasks[0].add_done_callback(lambda _: self.connections.remove(connection))
+        if role == PLAYER and player_count + 1 == self.players and not self.all_connected.done():
+            self.all_connected.set_result(None)
+
+    # Frames from players are used by the host and passed on to everyone else, spectators only listen
+    def on_message(self, connection: Connection, message: bytes):
+        if connection.role != PLAYER:
+            return
+        manager.parse_data(message)
+        self.broadcast(pack_message(message), connection)
+
+    # Queue one already framed message on every connection, except the one it came from
+    def broadcast(self, frame: bytes, origin: Connection | None = None):
+        for connection in self.connections:
+            if connection is not origin:
+                connection.queue_frame(frame)
+
+    # The frame is encoded once here no matter how many connections it goes to
+    def send(self, data: str | bytes):
+        if isinstance(data, str):
+            data = data.encode()
+        self.loop.call_soon_threadsafe(self.broadcast, pack_message(data))
+
+    # Spectators drop frames on their own, so only the players' connections slow the host down
+    def queue_depth(self) -> int:
+        return max((connection.queue_depth() for connection in self.connections if connection.role == PLAYER), default=0)
+
+    def buffered_bytes(self) -> int:
+        return max((connection.buffered_bytes() for connection in self.connections if connection.role == PLAYER), default=0)
+
+    async def shutdown(self):
+        for connection in list(self.connections):
+            connection.close()
+        self.server.close()
@@ -0,0 +1,101 @@
+# Compares the binary wire format in codec.py against the old JSON + GameObjParser path.
+# Run from the repository root: python benchmarks/bench_codec.py [troop count]
+import os
+import sys
+import json
+import inspect
+import random
+from timeit import timeit
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import draw
+import codec
+import manager
+
+str_to_obj = {"GameObject": draw.GameObject, "Building": draw.Building, "Troop": draw.Troop, "Vector2": draw.Vector2}
+
+# Vector2 is slotted now and has no __dict__, so it's written out as its coordinates
+def attributes(o):
+    if isinstance(o, draw.Vector2):
+        return {"x": o.x, "y": o.y}
+    return o.__dict__
+
+# The JSON encoder the game used before codec.py
+class GameObjParser(json.JSONEncoder):
+    def default(self, o):
+        if type(o) in str_to_obj.values():
+            return {"class": type(o).__name__, "data": attributes(o)}
+        try:
+            return json.JSONEncoder().default(o)
+        except TypeError:
+            return "z"
+
+def json_encode(lists):
+    data = {name: [{"class": type(o).__name__, "data": attributes(o)} for o in objects] for name, objects in lists.items()}
+    return json.dumps(data, skipkeys=True, cls=GameObjParser)
+
+def json_data_to_obj(obj_class, data):
+    for key in data:
+        if isinstance(data[key], dict) and "class" in data[key]:
+            data[key] = json_data_to_obj(str_to_obj[data[key]["class"]], data[key]["data"])
+    init_keys = [key for key in inspect.signature(obj_class.__init__).parameters if key != "self"]
+    init_args = {key: data[key] for key in init_keys if key in data}
+    instance = obj_class(**init_args)
+    for key, value in data.items():
+        if key not in init_args:
+            setattr(instance, key, value)
+    return instance
+
+def json_decode(data):
+    return {
+        name: [json_data_to_obj(str_to_obj[o["class"]], {k: v for k, v in o["data"].items() if v != "z"}) for o in objects]
+        for name, objects in json.loads(data).items()
+    }
+
+def binary_encode(lists):
+    return codec.encode_frame("p1", 1, 0, 0, {
+        name: {"changed": [codec.encode_object(o, name.endswith("_bullets")) for o in objects], "removed": []}
+        for name, objects in lists.items()
+    })
+
+# Builds game objects like json_decode does, so both decode times cover the same work
+def binary_decode(data):
+    return {
+        name: [manager.data_to_obj(codec.decode_object(record), {}) for record in delta["changed"]]
+        for name, delta in codec.decode_frame(data)["lists"].items()
+    }
+
+def make_lists(troop_count):
+    troops = []
+    for _ in range(troop_count):
+        troop = draw.Troop("imgs/red_soildger.png", (random.uniform(0, 6000), random.uniform(0, 4000)), 150, 10, random.randint(30, 40))
+        troop.scale((.25, .25))
+        troop.target = draw.Vector2(random.uniform(0, 6000), random.uniform(0, 4000))
+        troops.append(troop)
+    buildings = []
+    for sprite in ("imgs/barracks.png", "imgs/starport.png", "imgs/vehicle_depot.png", "imgs/command_center.png"):
+        building = draw.Building(sprite, (random.uniform(0, 1000), random.uniform(0, 1000)), 1000)
+        building.scale((.3, .3))
+        buildings.append(building)
+    return {"p1_troops": troops, "p1_buildings": buildings, "p1_bullets": []}
+
+def main():
+    troop_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    lists = make_lists(troop_count)
+    json_data, binary_data = json_encode(lists), binary_encode(lists)
+    runs = 50
+
+    print(f"{troop_count} troops, 4 buildings (full snapshot)")
+    print(f"{'':8}{'bytes':>10}{'encode ms':>12}{'decode ms':>12}")
+    for name, encode, decode, data in (
+        ("json", json_encode, json_decode, json_data),
+        ("binary", binary_encode, binary_decode, binary_data),
+    ):
+        encode_ms = timeit(lambda: encode(lists), number=runs) / runs * 1000
+        decode_ms = timeit(lambda: decode(data), number=runs) / runs * 1000
+        print(f"{name:8}{len(data):>10}{encode_ms:>12.3f}{decode_ms:>12.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Measures frames per second of the batched renderer against drawing every object on its own.
+# Run from the repository root: python benchmarks/bench_render.py [seconds per run]
+import os
+import sys
+import time
+import random
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+import assets
+import draw
+from render import Renderer
+from spatial import SpatialGrid
+
+SCREEN_SIZE = (1920, 1080)
+SPRITES = ("imgs/red_soildger.png", "imgs/red_tank.png", "imgs/red_ship.png", "imgs/blue_soildger.png")
+
+# Troops either crowd the camera or are spread over the whole 6000x4000 world
+def make_scene(troop_count, area):
+    background = draw.GameObject("imgs/background_grid.png", (0, 0))
+    background.resize((3000, 2000))
+    static = []
+    for sprite, position, factor in (
+        ("imgs/barracks.png", (650, 385), .29), ("imgs/starport.png", (350, 650), .65),
+        ("imgs/vehicle_depot.png", (645, 650), .3), ("imgs/command_center.png", (300, 300), .5),
+    ):
+        building = draw.Building(sprite, position, 1000)
+        building.scale((factor, factor))
+        static.append(building)
+    for i in range(9):
+        mineral = draw.Mineral("imgs/mineral.png", (20 + i * 40, 20 + (8 - i) * 35), 1000)
+        mineral.scale((.5, .5))
+        static.append(mineral)
+    troops = []
+    for _ in range(troop_count):
+        troop = draw.Troop(random.choice(SPRITES), (random.uniform(0, area[0]), random.uniform(0, area[1])), 150, 10, 30)
+        troop.scale((.25, .25))
+        troop.velocity = draw.Vector2(random.uniform(-2, 2), random.uniform(-2, 2))
+        troops.append(troop)
+    return background, static, troops
+
+def step(troops):
+    for troop in troops:
+        troop.position.x += troop.velocity.x
+        troop.position.y += troop.velocity.y
+        troop.rect.topleft = (troop.position.x, troop.position.y)
+
+# How draw.main drew a frame before: every object blitted on its own and the whole display pushed
+def draw_unbatched(screen, camera, background, static, troops):
+    for pos in ((0, 0), (3000, 0), (0, 2000), (3000, 2000)):
+        screen.blit(background.surf, (pos[0] - camera.x, pos[1] - camera.y))
+    for obj in static + troops:
+        obj.render(camera, screen)
+    pygame.display.update()
+
+def make_batched(screen):
+    renderer = Renderer(screen)
+    static_grid, troop_grid = SpatialGrid(), SpatialGrid()
+
+    def draw_batched(screen, camera, background, static, troops):
+        view = pygame.Rect(camera.x, camera.y, *SCREEN_SIZE)
+        static_blits = [
+            (background.surf, (pos[0] - camera.x, pos[1] - camera.y))
+            for pos in ((0, 0), (3000, 0), (0, 2000), (3000, 2000)) if view.colliderect((pos, background.rect.size))
+        ]
+        static_grid.sync(static)
+        troop_grid.sync(troops)
+        static_blits.extend(obj.blit_args(camera) for obj in static_grid.query(view))
+        renderer.present(static_blits, [obj.blit_args(camera) for obj in troop_grid.query(view)])
+    return draw_batched
+
+def measure(screen, draw_frame, troops, scene, seconds):
+    camera = draw.Vector2(0, 0)
+    frames = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        step(troops)
+        draw_frame(screen, camera, *scene)
+        pygame.event.pump()
+        frames += 1
+    return frames / (time.perf_counter() - start)
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    pygame.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+    assets.preload()
+    print(f"{'troops':>8}{'spread over':>14}{'unbatched fps':>16}{'batched fps':>14}")
+    for troop_count in (50, 200, 1000):
+        for name, area in (("screen", SCREEN_SIZE), ("world", (6000, 4000))):
+            random.seed(troop_count)
+            background, static, troops = make_scene(troop_count, area)
+            scene = (background, static, troops)
+            unbatched = measure(screen, draw_unbatched, troops, scene, seconds)
+            batched = measure(screen, make_batched(screen), troops, scene, seconds)
+            print(f"{troop_count:>8}{name:>14}{unbatched:>16.1f}{batched:>14.1f}")
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
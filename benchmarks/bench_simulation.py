@@ -0,0 +1,34 @@
+# Compares stepping troops as Python objects against the NumPy entity store.
+# Run from the repository root: python benchmarks/bench_simulation.py [squad size ...]
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simulation
+from entity_store import EntityStore
+
+STEPS = 150
+
+def run(squad_size: int, vectorized: bool):
+    random.seed(1)
+    game = simulation.new_game()
+    sim = simulation.Simulation(game, "p1", EntityStore() if vectorized else None)
+    simulation.skirmish(sim, squad_size)
+    start = time.perf_counter()
+    sim.run(STEPS)
+    elapsed = time.perf_counter() - start
+    return STEPS / elapsed, len(game["p1_troops"]), len(game["p2_troops"])
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [20, 200, 1000, 5000]
+    print(f"{'squad':>6} {'backend':>8} {'steps/s':>10} {'p1 left':>8} {'p2 left':>8}")
+    for size in sizes:
+        for vectorized in (False, True):
+            rate, p1_left, p2_left = run(size, vectorized)
+            print(f"{size:>6} {'numpy' if vectorized else 'objects':>8} {rate:>10.0f} {p1_left:>8} {p2_left:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# Compares the slotted Vector2 in simulation.py against the Vector2 the game used before.
+# Run from the repository root: python benchmarks/bench_vector.py [count]
+import os
+import sys
+import tracemalloc
+from math import sqrt
+from timeit import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulation import Vector2
+
+# The old Vector2, which worked out its length every time one was made
+class LegacyVector2:
+    def __init__(self, x: float, y: float):
+        self.x = x
+        self.y = y
+        self.length = sqrt(x**2 + y**2)
+
+    def normalize(self):
+        return LegacyVector2(self.x / self.length, self.y / self.length) if self.length > 0 else LegacyVector2(0, 0)
+
+    def __mul__(self, num: float):
+        return LegacyVector2(self.x * num, self.y * num)
+
+    def __sub__(self, other):
+        return LegacyVector2(self.x - other.x, self.y - other.y)
+
+# One troop step the way Troop.move and goto did it before
+def legacy_step(position, target, speed):
+    if (position - target).length > speed:
+        velocity = LegacyVector2(target.x - position.x, target.y - position.y).normalize() * speed
+        position.x += velocity.x
+        position.y += velocity.y
+
+# The same step with the in-place methods
+def slotted_step(position, target, speed):
+    if position.distance_to(target) > speed:
+        velocity = Vector2(target.x - position.x, target.y - position.y).normalize_().scale_(speed)
+        position += velocity
+
+def memory(vector_class, count: int) -> int:
+    tracemalloc.start()
+    vectors = [vector_class(i, i) for i in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del vectors
+    return size
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f"{'':>8} {'make (us)':>10} {'step (us)':>10} {'bytes each':>11}")
+    for name, vector_class, step in (("legacy", LegacyVector2, legacy_step), ("slotted", Vector2, slotted_step)):
+        make = timeit(lambda: vector_class(3.0, 4.0), number=count) / count * 1e6
+        position, target = vector_class(0.0, 0.0), vector_class(1e9, 1e9)
+        move = timeit(lambda: step(position, target, 10), number=count) / count * 1e6
+        print(f"{name:>8} {make:>10.3f} {move:>10.3f} {memory(vector_class, count) / count:>11.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import struct
+import simulation
+from math import isnan
+
+# Bump this whenever the layout below changes so old clients reject new frames
+VERSION = 4
+
+# Lists and sprites are sent as their index in these tuples instead of as strings.
+# Only ever add to the end of them, otherwise bump VERSION.
+PLAYERS = simulation.PLAYERS
+LISTS = ("p1_troops", "p2_troops", "p1_buildings", "p2_buildings", "p1_bullets", "p2_bullets")
+SPRITES = (
+    "imgs/b1.png",
+    "imgs/background_grid.png",
+    "imgs/barracks.png",
+    "imgs/black_ship.png",
+    "imgs/blue_soildger.png",
+    "imgs/blue_tank.png",
+    "imgs/collector.png",
+    "imgs/command_center.png",
+    "imgs/green.png",
+    "imgs/mineral.png",
+    "imgs/rally.png",
+    "imgs/red.png",
+    "imgs/red_ship.png",
+    "imgs/red_soildger.png",
+    "imgs/red_tank.png",
+    "imgs/starport.png",
+    "imgs/vehicle_depot.png",
+)
+SPRITE_IDS = {sprite: index for index, sprite in enumerate(SPRITES)}
+
+# What kind of object a record holds, always the first byte of the record
+TROOP = 1
+COLLECTOR = 2
+BUILDING = 3
+BULLET = 4
+
+# Frame: version, sending player, frame number, ack, ack delay, base frame, focus x, focus y, number of lists.
+# The ack delay is how long the sender held the acked frame before this frame went out, in milliseconds,
+# so the other side can take it out of its round trip time.
+# The focus is the centre of the sender's camera so the other side can send what's on screen first.
+FRAME_HEADER = struct.Struct("!BBIIHIffB")
+MAX_ACK_DELAY = 0xFFFF
+# List: list index, number of changed records, number of removed ids
+LIST_HEADER = struct.Struct("!BHH")
+OBJECT_ID = struct.Struct("!I")
+
+# kind, id, sprite, x, y, width, height, health, max health, speed, damage,
+# velocity x, velocity y, target x, target y, enemy target id, sight range, shot cooldown
+TROOP_RECORD = struct.Struct("!BIBffHHiififfffIHf")
+# kind, id, sprite, x, y, width, height, health, max health
+BUILDING_RECORD = struct.Struct("!BIBffHHii")
+# kind, id, sprite, x, y, width, height, speed, damage, enemy target id
+BULLET_RECORD = struct.Struct("!BIBffHHfiI")
+
+RECORDS = {TROOP: TROOP_RECORD, COLLECTOR: TROOP_RECORD, BUILDING: BUILDING_RECORD, BULLET: BULLET_RECORD}
+
+# Stands in for a missing target or focus point
+NO_TARGET = float("nan")
+
+def sprite_id(sprite: str) -> int:
+    try:
+        return SPRITE_IDS[sprite]
+    except KeyError:
+        raise ValueError(f"Sprite {sprite} can't be sent over the network") from None
+
+# Packs the fields of a game object that matter for the simulation into a record
+def encode_object(game_object, bullet: bool = False) -> bytes:
+    x, y = game_object.position
+    width, height = int(game_object.size.x), int(game_object.size.y)
+    sprite = sprite_id(game_object.sprite)
+    if isinstance(game_object, simulation.Projectile):
+        enemy_target = game_object.enemy_target.id if game_object.enemy_target else 0
+        return BULLET_RECORD.pack(
+            BULLET, game_object.id, sprite, x, y, width, height,
+            game_object.speed, game_object.damage, enemy_target
+        )
+    if isinstance(game_object, simulation.Troop):
+        enemy_target = game_object.enemy_target.id if game_object.enemy_target else 0
+        if bullet:
+            return BULLET_RECORD.pack(
+                BULLET, game_object.id, sprite, x, y, width, height,
+                game_object.speed, game_object.damage, enemy_target
+            )
+        target = game_object.target
+        if isinstance(target, simulation.GameObject):
+            target = target.position
+        target_x, target_y = target if target is not None else (NO_TARGET, NO_TARGET)
+        return TROOP_RECORD.pack(
+            COLLECTOR if isinstance(game_object, simulation.Collector) else TROOP,
+            game_object.id, sprite, x, y, width, height,
+            int(game_object.health), int(game_object.max_health), game_object.speed, int(game_object.damage),
+            game_object.velocity.x, game_object.velocity.y, target_x, target_y,
+            enemy_target, int(game_object.sight_range), game_object.shot_cooldown
+        )
+    if isinstance(game_object, simulation.Building):
+        return BUILDING_RECORD.pack(
+            BUILDING, game_object.id, sprite, x, y, width, height,
+            int(game_object.health), int(game_object.max_health)
+        )
+    raise ValueError(f"{type(game_object).__name__} can't be sent over the network")
+
+# Gets the object id out of a record without decoding the rest of it
+def record_id(record: bytes) -> int:
+    return OBJECT_ID.unpack_from(record, 1)[0]
+
+# Unpacks a record into a dictionary of the object's attributes
+def decode_object(record: bytes) -> dict:
+    kind = record[0]
+    if kind in (TROOP, COLLECTOR):
+        (kind, obj_id, sprite, x, y, width, height, health, max_health, speed, damage,
+         velocity_x, velocity_y, target_x, target_y, enemy_target, sight_range, shot_cooldown) = TROOP_RECORD.unpack(record)
+        return {
+            "kind": kind, "id": obj_id, "sprite": SPRITES[sprite], "position": (x, y), "size": (width, height),
+            "health": health, "max_health": max_health, "speed": speed, "damage": damage,
+            "velocity": (velocity_x, velocity_y),
+            "target": None if isnan(target_x) else (target_x, target_y),
+            "enemy_target": enemy_target, "sight_range": sight_range, "shot_cooldown": shot_cooldown,
+        }
+    if kind == BUILDING:
+        kind, obj_id, sprite, x, y, width, height, health, max_health = BUILDING_RECORD.unpack(record)
+        return {
+            "kind": kind, "id": obj_id, "sprite": SPRITES[sprite], "position": (x, y), "size": (width, height),
+            "health": health, "max_health": max_health,
+        }
+    if kind == BULLET:
+        kind, obj_id, sprite, x, y, width, height, speed, damage, enemy_target = BULLET_RECORD.unpack(record)
+        return {
+            "kind": kind, "id": obj_id, "sprite": SPRITES[sprite], "position": (x, y), "size": (width, height),
+            "speed": speed, "damage": damage, "enemy_target": enemy_target,
+        }
+    raise ValueError(f"Unknown record kind {kind}")
+
+# Packs a state frame. lists maps a list name to its changed records and removed ids.
+# ack_delay is in seconds.
+def encode_frame(player: str, frame: int, ack: int, base: int, lists: dict[str, dict[str, list]], focus: tuple[float, float] | None = None, ack_delay: float = 0.0) -> bytes:
+    focus_x, focus_y = focus if focus is not None else (NO_TARGET, NO_TARGET)
+    delay_ms = max(0, min(MAX_ACK_DELAY, round(ack_delay * 1000)))
+    parts = [FRAME_HEADER.pack(VERSION, PLAYERS.index(player), frame, ack, delay_ms, base, focus_x, focus_y, len(lists))]
+    for name, delta in lists.items():
+        changed, removed = delta["changed"], delta["removed"]
+        parts.append(LIST_HEADER.pack(LISTS.index(name), len(changed), len(removed)))
+        parts.append(struct.pack(f"!{len(removed)}I", *removed))
+        parts.extend(changed)
+    return b"".join(parts)
+
+# Unpacks a state frame into the same shape encode_frame takes, with the records left packed
+def decode_frame(data: bytes) -> dict:
+    if len(data) < FRAME_HEADER.size or data[0] != VERSION:
+        raise ValueError("Not a state frame for this version")
+    try:
+        _, player, frame, ack, delay_ms, base, focus_x, focus_y, list_count = FRAME_HEADER.unpack_from(data)
+        offset = FRAME_HEADER.size
+        lists = {}
+        for _ in range(list_count):
+            index, changed_count, removed_count = LIST_HEADER.unpack_from(data, offset)
+            offset += LIST_HEADER.size
+            removed = list(struct.unpack_from(f"!{removed_count}I", data, offset))
+            offset += removed_count * OBJECT_ID.size
+            changed = []
+            for _ in range(changed_count):
+                end = offset + RECORDS[data[offset]].size
+                if end > len(data):
+                    raise ValueError("Frame ends in the middle of a record")
+                changed.append(data[offset:end])
+                offset = end
+            lists[LISTS[index]] = {"changed": changed, "removed": removed}
+        player = PLAYERS[player]
+    except (struct.error, IndexError, KeyError):
+        raise ValueError("Malformed state frame") from None
+    focus = None if isnan(focus_x) else (focus_x, focus_y)
+    return {"player": player, "frame": frame, "ack": ack, "ack_delay": delay_ms / 1000, "base": base, "focus": focus, "lists": lists}
@@ -1,7 +1,15 @@
 import socket
+import struct
 import manager
 from threading import Thread
 
+# Every message on the wire is prefixed with its length as a 4 byte unsigned int
+HEADER = struct.Struct("!I")
+# Refuse anything bigger than this so a corrupt header can't make us buffer forever
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+# Read in big chunks so several small frames can come out of one recv call
+RECV_SIZE = 65536
+
 # Start a server instance
 def host_game():
     return Server()
@@ -10,6 +18,34 @@ def host_game():
 def connect(ip):
     return Client(ip)
 
+# Add the length prefix to a message so the other side knows where it ends
+def pack_message(data: bytes) -> bytes:
+    return HEADER.pack(len(data)) + data
+
+# Rebuilds whole messages out of whatever chunks the socket hands us
+class MessageReader:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    # Add newly received bytes and return every message that is now complete
+    def feed(self, data: bytes) -> list[bytes]:
+        self.buffer += data
+        messages = []
+        offset = 0
+        while len(self.buffer) - offset >= HEADER.size:
+            (length,) = HEADER.unpack_from(self.buffer, offset)
+            if length > MAX_MESSAGE_SIZE:
+                raise ValueError(f"Message of {length} bytes is too large")
+            end = offset + HEADER.size + length
+            # The rest of this message hasn't arrived yet
+            if len(self.buffer) < end:
+                break
+            messages.append(bytes(self.buffer[offset + HEADER.size:end]))
+            offset = end
+        # Only keep the partial message (if any) for the next read
+        del self.buffer[:offset]
+        return messages
+
 class Client:
     def __init__(self, ip):
         # Initialize the connection
@@ -20,20 +56,33 @@ class Client:
 
         self.recieving_thread = Thread(target=self.receive)
         self.recieving_thread.start()
-    
+
+    # Yields each complete message sent over this connection until it closes
+    def messages(self):
+        reader = MessageReader()
+        while True:
+            data = self.client.recv(RECV_SIZE)
+            if not data:
+                return
+            for message in reader.feed(data):
+                yield message
+
     def receive(self):
         try:
-            while True:
-                data = self.client.recv(10000).decode()
-                if data == "close" or not data:
+            for message in self.messages():
+                if message == b"close":
                     break
-                manager.parse_data(data)
+                manager.parse_data(message)
+        except OSError:
+            pass
         finally:
             self.close()
     
-    def send(self, data: str):
+    def send(self, data: str | bytes):
+        if isinstance(data, str):
+            data = data.encode()
         if self.client.fileno() != -1:
-            self.client.send(data.encode())
+            self.client.sendall(pack_message(data))
     
     def close(self):
         if self.socket.fileno() != -1:
@@ -57,4 +106,4 @@ class Server(Client):
         self.thread.start()
 
         print("All players connected")
-        self.send("All players connected")
\ No newline at end of file
+        self.send("All players connected")
@@ -0,0 +1,328 @@
+from simulation import Vector2, GameObject, Troop, SPEED_SCALE, PLAYERS
+
+# NumPy is only needed when a store is actually used, the rest of the game runs without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# What the enemy column holds when there's no target, or when the target isn't in the store
+NO_ENEMY = -1
+FOREIGN = -2
+
+# Every number the simulation needs about a troop or bullet, one array each
+FLOAT_FIELDS = (
+    "x", "y", "prev_x", "prev_y", "vx", "vy", "target_x", "target_y", "width", "height",
+    "health", "max_health", "speed", "damage", "sight_range", "shot_cooldown", "last_shot",
+)
+
+# Keeps troops and bullets as columns of arrays so a whole step is a few passes over the arrays
+# instead of a Python call per object. TroopProxy objects stand in for them in the game's lists.
+class EntityStore:
+    def __init__(self, capacity: int = 256):
+        if np is None:
+            raise ImportError("The entity store needs numpy, install it with pip install numpy")
+        self.capacity = capacity
+        for field in FLOAT_FIELDS:
+            setattr(self, field, np.zeros(capacity))
+        self.enemy = np.full(capacity, NO_ENEMY, dtype=np.int64)
+        self.has_target = np.zeros(capacity, dtype=bool)
+        self.bullet = np.zeros(capacity, dtype=bool)
+        self.player = np.zeros(capacity, dtype=np.int8)
+        # The proxy in each slot and the object it's shooting at, which may live outside the store
+        self.proxies: list[TroopProxy] = []
+        self.enemy_objects: list = []
+
+    def __len__(self):
+        return len(self.proxies)
+
+    def columns(self) -> list:
+        return [getattr(self, field) for field in FLOAT_FIELDS] + [self.enemy, self.has_target, self.bullet, self.player]
+
+    # Doubles every array when they're full
+    def grow(self):
+        self.capacity *= 2
+        for name in FLOAT_FIELDS + ("enemy", "has_target", "bullet", "player"):
+            column = getattr(self, name)
+            grown = np.full(self.capacity, NO_ENEMY, dtype=column.dtype) if name == "enemy" else np.zeros(self.capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    # Gives a new proxy the next free slot
+    def allocate(self, proxy) -> int:
+        if len(self.proxies) == self.capacity:
+            self.grow()
+        index = len(self.proxies)
+        for column in self.columns():
+            column[index] = NO_ENEMY if column is self.enemy else 0
+        self.proxies.append(proxy)
+        self.enemy_objects.append(None)
+        return index
+
+    def remove(self, proxy):
+        self.remove_many([proxy])
+
+    # Drops proxies and closes up the gaps in one pass over the arrays, however many there are
+    def remove_many(self, proxies):
+        count = len(self.proxies)
+        keep = np.ones(count, dtype=bool)
+        keep[[proxy.index for proxy in proxies]] = False
+        # Anything shooting at a removed proxy loses its target
+        enemy = self.enemy[:count]
+        orphaned = (enemy >= 0) & ~keep[np.maximum(enemy, 0)]
+        for shooter in np.flatnonzero(orphaned):
+            self.enemy_objects[shooter] = None
+        enemy[orphaned] = NO_ENEMY
+        # Where each kept slot ends up
+        new_index = np.cumsum(keep) - 1
+        local = enemy >= 0
+        enemy[local] = new_index[enemy[local]]
+        remaining = int(keep.sum())
+        for column in self.columns():
+            column[:remaining] = column[:count][keep]
+        self.proxies = [proxy for proxy, kept in zip(self.proxies, keep) if kept]
+        self.enemy_objects = [target for target, kept in zip(self.enemy_objects, keep) if kept]
+        for index, proxy in enumerate(self.proxies):
+            proxy.index = index
+        for proxy in proxies:
+            proxy.index = None
+
+    def set_enemy(self, index: int, target):
+        self.enemy_objects[index] = target
+        if target is None:
+            self.enemy[index] = NO_ENEMY
+        elif isinstance(target, TroopProxy) and target.store is self and target.index is not None:
+            self.enemy[index] = target.index
+        else:
+            self.enemy[index] = FOREIGN
+
+    # Does what Troop.move does for every proxy at once. Bullets are fired and dead objects
+    # are taken out of the game's lists after the array passes.
+    def step(self, now: float, game: dict):
+        count = len(self.proxies)
+        if not count:
+            return
+        x, y = self.x[:count], self.y[:count]
+        vx, vy = self.vx[:count], self.vy[:count]
+        target_x, target_y = self.target_x[:count], self.target_y[:count]
+        width, height = self.width[:count], self.height[:count]
+        health = self.health[:count]
+        has_target = self.has_target[:count]
+        enemy = self.enemy[:count]
+        self.prev_x[:count] = x
+        self.prev_y[:count] = y
+
+        # Where each object's enemy is. Enemies in the store are gathered in one go,
+        # the few that come from elsewhere (like the network) are read off the objects.
+        enemy_x, enemy_y = np.zeros(count), np.zeros(count)
+        enemy_left, enemy_top = np.zeros(count), np.zeros(count)
+        enemy_width, enemy_height = np.zeros(count), np.zeros(count)
+        enemy_health = np.zeros(count)
+        local = enemy >= 0
+        indexes = enemy[local]
+        enemy_x[local], enemy_y[local] = x[indexes], y[indexes]
+        enemy_left[local], enemy_top[local] = np.trunc(x[indexes]), np.trunc(y[indexes])
+        enemy_width[local], enemy_height[local] = width[indexes], height[indexes]
+        enemy_health[local] = health[indexes]
+        foreign = np.flatnonzero(enemy == FOREIGN)
+        for index in foreign:
+            target = self.enemy_objects[index]
+            enemy_x[index], enemy_y[index] = target.position.x, target.position.y
+            enemy_left[index], enemy_top[index], enemy_width[index], enemy_height[index] = target.rect
+            enemy_health[index] = target.health
+
+        # Enemy targeting: shoot what's in range, chase what isn't
+        targeting = enemy != NO_ENEMY
+        in_range = targeting & (np.hypot(x - enemy_x, y - enemy_y) <= self.sight_range[:count])
+        fire = in_range & (now - self.last_shot[:count] > self.shot_cooldown[:count])
+        shooters = [self.proxies[index] for index in np.flatnonzero(fire)]
+        self.last_shot[:count][fire] = now
+        vx[in_range] = 0
+        vy[in_range] = 0
+        has_target[in_range] = False
+        chase = targeting & ~in_range
+        target_x[chase] = enemy_x[chase]
+        target_y[chase] = enemy_y[chase]
+        has_target[chase] = True
+
+        # Bullets hitting their target, the same test as Rect.colliderect
+        left, top = np.trunc(x), np.trunc(y)
+        hit = (
+            targeting & self.bullet[:count] & (width > 0) & (height > 0) & (enemy_width > 0) & (enemy_height > 0)
+            & (left < enemy_left + enemy_width) & (left + width > enemy_left)
+            & (top < enemy_top + enemy_height) & (top + height > enemy_top)
+        )
+        # Only damage what was still alive at the start of the step
+        damaging = hit & (enemy_health > 0)
+        np.subtract.at(self.health, enemy[damaging & local], self.damage[:count][damaging & local])
+        foreign_hits = [(self.proxies[index], self.enemy_objects[index]) for index in np.flatnonzero(damaging & (enemy == FOREIGN))]
+        for shooter, target in foreign_hits:
+            target.health -= shooter.damage
+        lost = targeting & ~hit & (enemy_health <= 0)
+        enemy[lost] = NO_ENEMY
+        for index in np.flatnonzero(lost):
+            self.enemy_objects[index] = None
+
+        # Movement towards targets
+        moving = has_target.copy()
+        distance_x, distance_y = target_x - x, target_y - y
+        distance = np.hypot(distance_x, distance_y)
+        step_length = self.speed[:count] * SPEED_SCALE
+        arrive = moving & (distance <= step_length)
+        vx[arrive] = 0
+        vy[arrive] = 0
+        x[arrive] = target_x[arrive]
+        y[arrive] = target_y[arrive]
+        go = moving & ~arrive
+        vx[go] = distance_x[go] / distance[go] * step_length[go]
+        vy[go] = distance_y[go] / distance[go] * step_length[go]
+        x[moving] += vx[moving]
+        y[moving] += vy[moving]
+        for index in np.flatnonzero(moving):
+            self.proxies[index].moved()
+
+        # Bullets that hit are used up, and so are bullets whose target is gone once they reach where they last saw it
+        stranded = self.bullet[:count] & (enemy == NO_ENEMY) & (arrive | ~moving)
+        dead = {self.proxies[index] for index in np.flatnonzero(hit | stranded)}
+        # Anything whose health ran out is destroyed
+        dead.update(self.proxies[index] for index in np.flatnonzero(health <= 0))
+        for shooter, target in foreign_hits:
+            enemy_troops = game[f"{PLAYERS[1 - shooter.player]}_troops"]
+            if target.health <= 0 and target in enemy_troops:
+                enemy_troops.remove(target)
+
+        # Arrays may grow from here on, so nothing above this line can be used anymore
+        for shooter in shooters:
+            if shooter not in dead:
+                shooter.projectile(game[f"{PLAYERS[shooter.player]}_bullets"])
+
+        if dead:
+            for name in {proxy.list_name() for proxy in dead}:
+                game[name][:] = [obj for obj in game[name] if obj not in dead]
+            self.remove_many(dead)
+
+# A Vector2 that reads and writes two of the store's columns, so code that changes
+# position.x in place still moves the proxy
+class ArrayVector(Vector2):
+    __slots__ = ("proxy", "x_field", "y_field")
+
+    def __init__(self, proxy, x_field: str, y_field: str):
+        self.proxy = proxy
+        self.x_field = x_field
+        self.y_field = y_field
+
+    @property
+    def x(self) -> float:
+        return float(getattr(self.proxy.store, self.x_field)[self.proxy.index])
+
+    @x.setter
+    def x(self, value: float):
+        getattr(self.proxy.store, self.x_field)[self.proxy.index] = value
+
+    @property
+    def y(self) -> float:
+        return float(getattr(self.proxy.store, self.y_field)[self.proxy.index])
+
+    @y.setter
+    def y(self, value: float):
+        getattr(self.proxy.store, self.y_field)[self.proxy.index] = value
+
+# A property that reads and writes one of the store's columns
+def column(field: str) -> property:
+    def get(self):
+        return getattr(self.store, field)[self.index].item()
+
+    def set(self, value):
+        getattr(self.store, field)[self.index] = value
+
+    return property(get, set)
+
+# A Troop whose numbers live in an EntityStore. It can go anywhere a Troop can,
+# but only the store moves it.
+class TroopProxy(Troop):
+    vectorized = True
+
+    def __init__(self, store: EntityStore, player: str, sprite: str, position: tuple, max_health: int, speed: int, damage: int, sight_range: int = 250, shot_cooldown: int = 1, bullet: bool = False):
+        self.store = store
+        self.index = store.allocate(self)
+        store.player[self.index] = PLAYERS.index(player)
+        store.bullet[self.index] = bullet
+        super().__init__(sprite, position, max_health, speed, damage, sight_range, shot_cooldown)
+        store.width[self.index], store.height[self.index] = self.rect.size
+
+    health = column("health")
+    max_health = column("max_health")
+    speed = column("speed")
+    damage = column("damage")
+    sight_range = column("sight_range")
+    shot_cooldown = column("shot_cooldown")
+    time_since_shot = column("last_shot")
+
+    @property
+    def player(self) -> int:
+        return int(self.store.player[self.index])
+
+    @property
+    def position(self) -> Vector2:
+        return ArrayVector(self, "x", "y")
+
+    @position.setter
+    def position(self, value):
+        self.store.x[self.index], self.store.y[self.index] = value
+
+    @property
+    def velocity(self) -> Vector2:
+        return ArrayVector(self, "vx", "vy")
+
+    @velocity.setter
+    def velocity(self, value):
+        self.store.vx[self.index], self.store.vy[self.index] = value
+
+    @property
+    def target(self) -> Vector2 | None:
+        return ArrayVector(self, "target_x", "target_y") if self.store.has_target[self.index] else None
+
+    @target.setter
+    def target(self, value):
+        if isinstance(value, GameObject):
+            value = value.position
+        self.store.has_target[self.index] = value is not None
+        if value is not None:
+            self.store.target_x[self.index], self.store.target_y[self.index] = value
+
+    @property
+    def enemy_target(self):
+        return self.store.enemy_objects[self.index]
+
+    @enemy_target.setter
+    def enemy_target(self, value):
+        self.store.set_enemy(self.index, value)
+
+    @property
+    def prev_position(self) -> tuple[float, float]:
+        return (self.store.prev_x[self.index], self.store.prev_y[self.index])
+
+    @prev_position.setter
+    def prev_position(self, value):
+        if value is None:
+            value = (self.store.x[self.index], self.store.y[self.index])
+        self.store.prev_x[self.index], self.store.prev_y[self.index] = value
+
+    def moved(self):
+        self.rect.topleft = (self.store.x[self.index], self.store.y[self.index])
+        if self.grid is not None:
+            self.grid.update(self)
+
+    def resize(self, size: tuple):
+        super().resize(size)
+        self.store.width[self.index], self.store.height[self.index] = self.rect.size
+
+    # The game list this proxy belongs in
+    def list_name(self) -> str:
+        return f"{PLAYERS[self.player]}_{'bullets' if self.store.bullet[self.index] else 'troops'}"
+
+    def projectile(self, bullets: list):
+        bullet = TroopProxy(self.store, PLAYERS[self.player], "imgs/b1.png", (self.position.x, self.position.y), 1, 50, self.damage, 0, bullet=True)
+        bullet.scale((.5, .5))
+        bullets.append(bullet)
+        bullet.enemy_target = self.enemy_target
@@ -0,0 +1,39 @@
+from collections import deque
+from simulation import STEPS_PER_SECOND
+
+# Remote objects are drawn this far behind the newest snapshot so there's usually a newer one to move towards
+INTERPOLATION_DELAY = 0.2
+# When snapshots are late, guess ahead using the object's velocity for at most this long
+MAX_EXTRAPOLATION = 0.5
+
+# Keeps the last few positions received for a remote object and works out where to draw it
+class InterpolationBuffer:
+    def __init__(self, size: int = 8):
+        # (time received, x, y), oldest first
+        self.samples: deque[tuple[float, float, float]] = deque(maxlen=size)
+
+    def add(self, timestamp: float, x: float, y: float):
+        # Frames merged before the render thread saw them can share a timestamp, keep only the newest
+        if self.samples and self.samples[-1][0] >= timestamp:
+            self.samples.pop()
+        self.samples.append((timestamp, x, y))
+
+    # Where the object should be drawn at time now
+    def position_at(self, now: float, velocity) -> tuple[float, float]:
+        render_time = now - INTERPOLATION_DELAY
+        newest_time, newest_x, newest_y = self.samples[-1]
+        # Nothing newer to move towards, so keep going the way it was going
+        if render_time >= newest_time:
+            # Velocities are in pixels per simulation step, STEPS_PER_SECOND of which run every second
+            ahead = min(render_time - newest_time, MAX_EXTRAPOLATION) * STEPS_PER_SECOND
+            return newest_x + velocity.x * ahead, newest_y + velocity.y * ahead
+
+        # Find the two snapshots either side of the render time and blend between them
+        newer = self.samples[-1]
+        for older in reversed(self.samples):
+            if older[0] <= render_time:
+                blend = (render_time - older[0]) / (newer[0] - older[0])
+                return older[1] + (newer[1] - older[1]) * blend, older[2] + (newer[2] - older[2]) * blend
+            newer = older
+        # Older than anything we have
+        return self.samples[0][1], self.samples[0][2]
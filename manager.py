@@ -1,97 +1,247 @@
 import draw
-import json
-import inspect
-
-# A class to convert all the game objects to json
-class GameObjParser(json.JSONEncoder):
-    # Override the default function, which is responsible for converting objects to a JSON-compatible format
-    def default(self, o):
-        # If the object's class is one that we know how to parse, parse it
-        if type(o) in str_to_obj.values():
-            return obj_to_data(o)
-        # Otherwise try to convert it in the recular default function
-        else:
-            try:
-                return json.JSONEncoder().default(o)
-            # If it still hasn't been converted, mark it and it will be dealt with later
-            except TypeError:
-                return "z"
-
-# Receives a JSON string and turns it into a game sate
-def parse_data(data: str):
+import codec
+import simulation
+import time
+from math import hypot
+from threading import Lock
+from interpolation import InterpolationBuffer
+
+# Send a full copy of the game every this many frames so a lost base can be recovered
+KEYFRAME_INTERVAL = 30
+# How many old frames each side remembers to diff against
+HISTORY_SIZE = 64
+
+# A frame's state is every object's packed record, grouped by list and keyed by the object's id
+State = dict[str, dict[int, bytes]]
+
+# Number of the last frame we sent, the state each recent frame left the other player with and when it was sent
+sent_frame = 0
+sent_history: dict[int, State] = {}
+sent_times: dict[int, float] = {}
+# The newest of our frames the other player has told us they received
+acked_frame = 0
+# Smoothed time between sending a frame and hearing it was received, in seconds. The time the other player
+# held on to the frame before their next send went out is taken off, so their send rate doesn't count as latency.
+rtt = 0.0
+# How many changed objects the last frame had, and how many of them had to wait for a later frame
+pending_changes = 0
+deferred_changes = 0
+
+# Centre of our camera and of the other player's, used to send what they can see first
+local_focus: tuple[float, float] | None = None
+peer_focus: tuple[float, float] | None = None
+# Number of the last frame we received from each player (sent back as our ack), when it arrived and the
+# states rebuilt from them. Spectators get frames from both players, so these are kept per player.
+received_frames: dict[str, int] = {}
+received_times: dict[str, float] = {}
+received_history: dict[str, dict[int, State]] = {}
+
+# Back buffer the network thread writes decoded frames into. Each list maps to its newest state, the ids
+# that changed since the render thread last applied it and when it arrived. The lock is only held to swap it out.
+remote_updates: dict[str, tuple[dict[int, bytes], set[int], float]] = {}
+remote_lock = Lock()
+# Front buffer of our own lists, published by the render thread once per frame for the sender to read
+local_snapshot: dict[str, tuple[simulation.GameObject, ...]] = {}
+
+# Receives a binary state frame and turns it into a game sate
+def parse_data(data: bytes):
+    global acked_frame, rtt, peer_focus
     try:
-        # Load the JSON
-        parsed: dict[str, list[dict[str, dict]]] = json.loads(data)
-        # For every category (troops, buidings, bullets) in the dictionary
-        for list_obj in parsed:
-            # Clear the game's memory of the category so it can be reconstructed
-            game[list_obj].clear()
-            # For each individual object
-            for game_object in parsed.get(list_obj):
-                # Get the class from the data
-                obj_class = str_to_obj[game_object["class"]]
-                # Get the recieved data about the object
-                attributes = {k: v for k, v in game_object["data"].items() if v != "z"}
-                # Turn the data back into an object and add it back to the object list
-                game[list_obj].append(data_to_obj(obj_class, attributes))
-    except json.decoder.JSONDecodeError:
+        frame = codec.decode_frame(data)
+    # Ignore anything that isn't a state frame (like the connection message)
+    except ValueError:
         return
+    if frame["ack"] > acked_frame:
+        acked_frame = frame["ack"]
+        sent_time = sent_times.get(acked_frame)
+        if sent_time is not None:
+            sample = max(0.0, time.monotonic() - sent_time - frame["ack_delay"])
+            rtt = sample if rtt == 0 else rtt * 0.875 + sample * 0.125
+    if frame["focus"] is not None:
+        peer_focus = frame["focus"]
+    history = received_history.setdefault(frame["player"], {})
+
+    # Rebuild the full state from the frame this one was diffed against
+    if frame["base"]:
+        base = history.get(frame["base"])
+        # We no longer have the base, so wait for the next keyframe
+        if base is None:
+            return
+    else:
+        base = {}
+    state = {list_obj: dict(objects) for list_obj, objects in base.items()}
+    for list_obj, delta in frame["lists"].items():
+        objects = state.setdefault(list_obj, {})
+        for obj_id in delta["removed"]:
+            objects.pop(obj_id, None)
+        for record in delta["changed"]:
+            objects[codec.record_id(record)] = record
+
+    received_frames[frame["player"]] = frame["frame"]
+    received_times[frame["player"]] = time.monotonic()
+    history[frame["frame"]] = state
+    history.pop(frame["frame"] - HISTORY_SIZE, None)
+
+    # Hand the new state to the render thread, merging with anything it hasn't applied yet
+    received_at = time.monotonic()
+    with remote_lock:
+        for list_obj, delta in frame["lists"].items():
+            changed = {codec.record_id(record) for record in delta["changed"]}
+            if list_obj in remote_updates:
+                changed |= remote_updates[list_obj][1]
+            remote_updates[list_obj] = (state[list_obj], changed, received_at)
+
+# Called by the render thread between frames: applies received state and publishes our own
+def sync_game(player: str, focus: tuple[float, float] | None = None):
+    global remote_updates, local_focus
+    local_focus = focus
+    with remote_lock:
+        updates, remote_updates = remote_updates, {}
+    for list_obj, (objects, changed, received_at) in updates.items():
+        apply_state(list_obj, objects, changed, received_at)
+    now = time.monotonic()
+    for obj_list in game:
+        if player in obj_list:
+            local_snapshot[obj_list] = tuple(game[obj_list])
+        else:
+            interpolate(game[obj_list], now)
+
+# Moves remote troops smoothly between the snapshots we've received
+def interpolate(objects: list[simulation.GameObject], now: float):
+    for game_object in objects:
+        if game_object.interpolation is not None:
+            game_object.position.x, game_object.position.y = game_object.interpolation.position_at(now, game_object.velocity)
+            game_object.moved()
+
+# Brings one of the game's lists in line with a received state
+def apply_state(list_obj: str, state: dict[int, bytes], changed: set[int], received_at: float):
+    # Enemy targets point at objects owned by the other player
+    other_player = "p1" if list_obj.startswith("p2") else "p2"
+    targets = {game_object.id: game_object for game_object in game[f"{other_player}_troops"] + game[f"{other_player}_buildings"]}
+    # Match the objects we already have to the received ones by id
+    existing = {game_object.id: game_object for game_object in game[list_obj]}
+    objects = []
+    for obj_id, record in state.items():
+        instance = existing.get(obj_id)
+        if instance is None:
+            # Only objects we haven't seen before are constructed
+            instance = data_to_obj(codec.decode_object(record), targets)
+            # Troops and bullets are moved by interpolation from now on instead of jumping to each snapshot,
+            # the simulation leaves them alone
+            if isinstance(instance, (simulation.Troop, simulation.Projectile)):
+                instance.interpolation = InterpolationBuffer()
+                instance.interpolation.add(received_at, *instance.position)
+        elif obj_id in changed:
+            update_obj(instance, codec.decode_object(record), targets, received_at)
+        objects.append(instance)
+    # Replace the contents in place so anything holding on to the list sees the update
+    game[list_obj][:] = objects
+
+# Builds a new game object out of decoded record data
+def data_to_obj(data: dict, targets: dict) -> simulation.GameObject:
+    kind = data["kind"]
+    if kind == codec.BUILDING:
+        instance = simulation.Building(data["sprite"], data["position"], data["max_health"])
+    elif kind == codec.COLLECTOR:
+        instance = simulation.Collector(data["sprite"], data["position"], data["max_health"], data["speed"], data["damage"], None, None)
+    elif kind == codec.BULLET:
+        instance = simulation.Projectile(data["sprite"], data["position"], data["speed"], data["damage"])
+    else:
+        instance = simulation.Troop(data["sprite"], data["position"], data["max_health"], data["speed"], data["damage"])
+    update_obj(instance, data, targets)
+    return instance
 
-def data_to_obj(obj_class, data):
-    for key in data:
-        attribute = data[key]
-        if isinstance(attribute, dict):
-            if "class" in attribute.keys():
-                data[key] = data_to_obj(str_to_obj[attribute["class"]], attribute["data"])
-    # Get the __init__ parameter names (excluding 'self')
-    init_params = inspect.signature(obj_class.__init__).parameters
-    init_keys = [key for key in init_params if key != 'self']
-    
-    # Filter only the attributes that match __init__ parameters
-    init_args = {key: data[key] for key in init_keys if key in data}
-
-    # Create an instance using the filtered arguments
-    instance = obj_class(**init_args)
-
-    # Assign remaining attributes
+# Copies decoded record data onto an object that already exists
+def update_obj(instance, data: dict, targets: dict, received_at: float = 0):
     for key, value in data.items():
-        # If the attribute wasn't already assigned through __init__
-        if key not in init_args:
+        if key == "kind":
+            continue
+        if key == "position":
+            if instance.interpolation is not None:
+                instance.interpolation.add(received_at, *value)
+                continue
+            # Vectors are updated in place so references to them stay valid
+            instance.position.x, instance.position.y = value
+        elif key == "size":
+            if tuple(instance.size) != value:
+                instance.resize(value)
+        elif key == "velocity":
+            instance.velocity = simulation.Vector2(*value)
+        elif key == "target":
+            instance.target = simulation.Vector2(*value) if value is not None else None
+        elif key == "enemy_target":
+            instance.enemy_target = targets.get(value)
+        else:
             setattr(instance, key, value)
-    
-    return instance
-    
+    # Keep the rect where the object is
+    instance.moved()
+
+# Encodes only the objects that changed since the last frame the other player received.
+# With a limit, at most that many changed objects are sent, closest to the other player's camera first,
+# and the rest are left for later frames.
+def game_to_data(player: str, full: bool = False, limit: int | None = None) -> bytes:
+    global sent_frame, pending_changes, deferred_changes
+    sent_frame += 1
+
+    # Fall back to a keyframe when asked, on schedule, or when there's nothing to diff against
+    base = sent_history.get(acked_frame)
+    keyframe = full or base is None or sent_frame % KEYFRAME_INTERVAL == 0
+    if keyframe:
+        base = {}
 
-def game_to_data(player: str):
-    data: dict[str, list]= {}
+    state: State = {}
+    lists = {}
+    changes = []
     for obj_list in game:
         if player not in obj_list:
             continue
-        data[obj_list] = []
-        for game_object in game.get(obj_list):
-            data[obj_list].append(obj_to_data(game_object))
-    return json.dumps(data, skipkeys=True, cls=GameObjParser)
+        bullet = obj_list.endswith("_bullets")
+        base_objects = base.get(obj_list, {})
+        # Start from what the other player will already have
+        objects = state[obj_list] = dict(base_objects)
+        # Read the copy the render thread published so the list can't change while we encode it
+        current = local_snapshot.get(obj_list, game.get(obj_list))
+        current_ids = set()
+        for game_object in current:
+            current_ids.add(game_object.id)
+            record = codec.encode_object(game_object, bullet)
+            if base_objects.get(game_object.id) != record:
+                changes.append((obj_list, game_object, record))
+        removed = [obj_id for obj_id in base_objects if obj_id not in current_ids]
+        for obj_id in removed:
+            del objects[obj_id]
+        lists[obj_list] = {"changed": [], "removed": removed}
 
-def obj_to_data(game_object):
-    object_dict = {}
-    object_dict["class"] = type(game_object).__name__
-    object_dict["data"] = game_object.__dict__
-    return object_dict
+    pending_changes = len(changes)
+    # Keyframes always carry everything so they can be used to recover
+    if limit is not None and not keyframe and len(changes) > limit:
+        if peer_focus is not None:
+            changes.sort(key=lambda change: hypot(change[1].position.x - peer_focus[0], change[1].position.y - peer_focus[1]))
+        changes = changes[:limit]
+    deferred_changes = pending_changes - len(changes)
+    for obj_list, game_object, record in changes:
+        lists[obj_list]["changed"].append(record)
+        state[obj_list][game_object.id] = record
 
+    # Lists that haven't changed are left out, except in keyframes where every list is sent
+    if not keyframe:
+        lists = {obj_list: delta for obj_list, delta in lists.items() if delta["changed"] or delta["removed"]}
 
-str_to_obj = {
-    "GameObject": draw.GameObject,
-    "Building": draw.Building,
-    "Troop": draw.Troop,
-    "Vector2": draw.Vector2
-}
+    sent_history[sent_frame] = state
+    sent_history.pop(sent_frame - HISTORY_SIZE, None)
+    sent_times[sent_frame] = time.monotonic()
+    sent_times.pop(sent_frame - HISTORY_SIZE, None)
+    other_player = "p2" if player == "p1" else "p1"
+    ack = received_frames.get(other_player, 0)
+    ack_delay = time.monotonic() - received_times[other_player] if other_player in received_times else 0.0
+    return codec.encode_frame(player, sent_frame, ack, 0 if keyframe else acked_frame, lists, local_focus, ack_delay)
 
-game: dict[str, list[draw.GameObject]] = {"p1_troops": [], "p2_troops": [], "p1_buildings": [], "p2_buildings": [], "p1_bullets": [], "p2_bullets": []}
+game: dict[str, list[simulation.GameObject]] = simulation.new_game()
 
 GLOBAL_SCALE = (.25, .25)
 
 def main():
-    draw.main(game, "p1")
+    draw.main(game, "p1", sync_game)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,42 @@
+import pygame
+import assets
+
+# Selection markers, the rally flag and health bars, drawn from surfaces made once
+# instead of building new game objects every frame
+class Overlay:
+    HEALTH_BAR_WIDTH = 60
+    HEALTH_BAR_HEIGHT = 5
+
+    def __init__(self):
+        self.selection = self.scaled_image('imgs/green.png', .15)
+        self.rally_flag = self.scaled_image('imgs/rally.png', .2)
+        self.health_back = pygame.Surface((self.HEALTH_BAR_WIDTH, self.HEALTH_BAR_HEIGHT))
+        self.health_back.fill((255, 0, 0))
+        self.health_front = pygame.Surface((self.HEALTH_BAR_WIDTH, self.HEALTH_BAR_HEIGHT))
+        self.health_front.fill((0, 255, 0))
+
+    def scaled_image(self, sprite: str, factor: float) -> pygame.Surface:
+        width, height = assets.get_image(sprite).get_size()
+        return assets.get_image(sprite, (int(width * factor), int(height * factor)))
+
+    # (surface, position[, area]) pairs for everything the overlay draws this frame.
+    # Health bars are shown for selected objects and anything on screen that has been damaged.
+    # alpha places them where the objects are drawn between simulation steps.
+    def blits(self, camera, visible: list, selected: list, rally, alpha: float = 1.0) -> list:
+        blits = []
+        if rally is not None:
+            blits.append((self.rally_flag, (rally.x - camera.x, rally.y - camera.y)))
+        for obj in selected:
+            x, y = obj.draw_rect(alpha).midbottom
+            blits.append((self.selection, (x - camera.x - self.selection.get_width() // 2, y - camera.y)))
+        for obj in visible:
+            max_health = getattr(obj, "max_health", 0)
+            if max_health <= 0 or (obj.health >= max_health and obj not in selected):
+                continue
+            rect = obj.draw_rect(alpha)
+            width = min(rect.width, self.HEALTH_BAR_WIDTH)
+            position = (rect.centerx - camera.x - width // 2, rect.top - camera.y - self.HEALTH_BAR_HEIGHT - 2)
+            health = max(0, min(obj.health / max_health, 1))
+            blits.append((self.health_back, position, (0, 0, width, self.HEALTH_BAR_HEIGHT)))
+            blits.append((self.health_front, position, (0, 0, int(width * health), self.HEALTH_BAR_HEIGHT)))
+        return blits
@@ -1,6 +1,8 @@
-import connector
+import async_connector as connector
 import manager
 import draw
+from simulation import SPECTATOR
+from scheduler import SendScheduler
 from threading import Thread
 from time import sleep
 
@@ -15,13 +17,16 @@ def prompt(text = "", options = [], error = ""):
         user_input = prompt(text, options)
     return user_input
 
+# Send the game, then wait until the scheduler says it's time to send again
 def send_game():
     # print(manager.game_to_data())
-    player.send(manager.game_to_data(player_number))
+    sleep(scheduler.send())
 
 print("Welcome to ____\n")
 
-is_hosting = prompt("Are you hosting or joining a game?\n1. Hosting\n2. Joining", ["1", "2"]) == "1"
+choice = prompt("Are you hosting, joining or spectating a game?\n1. Hosting\n2. Joining\n3. Spectating", ["1", "2", "3"])
+is_hosting = choice == "1"
+is_spectating = choice == "3"
 
 # Make the player either a host or a client
 if is_hosting:
@@ -29,17 +34,22 @@ if is_hosting:
 else:
     print("What IP address do you want to connect to?")
     ip = input()
-    player = connector.connect(ip)
+    player = connector.connect(ip, spectator=is_spectating)
 
-player_number = "p1" if is_hosting else "p2"
+# Spectators don't play either side, so both players' lists are treated as remote
+player_number = "p1" if is_hosting else SPECTATOR if is_spectating else "p2"
+scheduler = SendScheduler(player, player_number)
 
 try:
-    draw_thread = Thread(target=draw.main, args=[manager.game, player_number])
+    draw_thread = Thread(target=draw.main, args=[manager.game, player_number, manager.sync_game])
     # draw_thread = Thread(target=manager.main)
     draw_thread.start()
     while True:
-        send_game()
-        sleep(1/10)
+        # Spectators only watch, so they never send their game
+        if not is_spectating:
+            send_game()
+        else:
+            sleep(1/10)
 except KeyboardInterrupt:
     print("Ending game...")
 finally:
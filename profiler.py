@@ -0,0 +1,137 @@
+import csv
+import json
+import time
+import pygame
+from collections import deque
+
+# Times each part of a frame and keeps the last few hundred frames so slow ones stand out.
+# Call start_frame at the top of the frame, lap after each phase with the phase's name,
+# and end_frame at the bottom.
+class Profiler:
+    # How many frames the rolling numbers cover
+    WINDOW = 300
+    # The text on screen is only redrawn this often, drawing text every frame would show up in the numbers
+    REDRAW_FRAMES = 15
+    # Frames written to the dump file are pushed to disk this often, so a killed game still leaves them behind
+    FLUSH_FRAMES = 60
+    FONT_SIZE = 22
+
+    def __init__(self, dump_path: str | None = None, window: int = WINDOW):
+        self.window = window
+        self.frame_times: deque[float] = deque(maxlen=window)
+        self.phase_times: dict[str, deque[float]] = {}
+        self.counts: dict[str, int] = {}
+        # Every frame's numbers are written to this file as the frame ends, and dump() finishes it
+        self.dump_path = dump_path
+        self.file = None
+        self.writer = None
+        self.frame_start = self.last_lap = time.perf_counter()
+        self.current: dict[str, float] = {}
+        self.frames = 0
+        # The on-screen overlay, switched with F3
+        self.visible = False
+        self.font = None
+        self.text: list[pygame.Surface] = []
+
+    def start_frame(self):
+        self.frame_start = self.last_lap = time.perf_counter()
+        self.current = {}
+
+    # Ends a phase, the time since the last lap or the start of the frame goes to name
+    def lap(self, name: str):
+        now = time.perf_counter()
+        self.current[name] = self.current.get(name, 0) + now - self.last_lap
+        self.last_lap = now
+
+    def count(self, name: str, value: int):
+        self.counts[name] = value
+
+    def end_frame(self):
+        frame_time = time.perf_counter() - self.frame_start
+        self.frame_times.append(frame_time)
+        for name, phase_time in self.current.items():
+            times = self.phase_times.get(name)
+            if times is None:
+                times = self.phase_times[name] = deque(maxlen=self.window)
+            times.append(phase_time)
+        if self.dump_path:
+            self.write({"frame": self.frames, "frame_ms": frame_time * 1000, **{f"{name}_ms": phase_time * 1000 for name, phase_time in self.current.items()}, **self.counts})
+        self.frames += 1
+
+    # Adds one frame to the dump file, as CSV or JSON depending on the file's extension.
+    # CSV columns come from the first frame, which already has every phase and count the game times.
+    def write(self, record: dict):
+        if self.file is None:
+            self.file = open(self.dump_path, "w", newline="")
+            if self.dump_path.endswith(".csv"):
+                self.writer = csv.DictWriter(self.file, list(record), restval="", extrasaction="ignore")
+                self.writer.writeheader()
+            else:
+                self.file.write('{"frames": [\n')
+        elif self.writer is None:
+            self.file.write(",\n")
+        if self.writer is not None:
+            self.writer.writerow(record)
+        else:
+            self.file.write(json.dumps(record))
+        if self.frames % self.FLUSH_FRAMES == 0:
+            self.file.flush()
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.text = []
+
+    # The 50th, 95th and 99th percentile of some times, in milliseconds
+    @staticmethod
+    def percentiles(times) -> tuple[float, float, float]:
+        if not times:
+            return (0.0, 0.0, 0.0)
+        ordered = sorted(times)
+        last = len(ordered) - 1
+        return tuple(ordered[round(last * fraction)] * 1000 for fraction in (.5, .95, .99))
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.frames,
+            "frame_ms": dict(zip(("p50", "p95", "p99"), self.percentiles(self.frame_times))),
+            "phases_ms": {
+                name: dict(zip(("p50", "p95", "p99"), self.percentiles(times)))
+                for name, times in self.phase_times.items()
+            },
+            "counts": dict(self.counts),
+        }
+
+    def lines(self) -> list[str]:
+        p50, p95, p99 = self.percentiles(self.frame_times)
+        lines = [f"frame  p50 {p50:5.1f}  p95 {p95:5.1f}  p99 {p99:5.1f} ms"]
+        for name, times in self.phase_times.items():
+            p50, p95, p99 = self.percentiles(times)
+            lines.append(f"{name:<14} p50 {p50:5.2f}  p95 {p95:5.2f}  p99 {p99:5.2f} ms")
+        lines.extend(f"{name:<14} {value}" for name, value in self.counts.items())
+        return lines
+
+    # (surface, position) pairs for the overlay, empty while it's hidden
+    def blits(self, position: tuple[int, int] = (10, 10)) -> list:
+        if not self.visible:
+            return []
+        if not self.text or self.frames % self.REDRAW_FRAMES == 0:
+            if self.font is None:
+                pygame.font.init()
+                self.font = pygame.font.Font(None, self.FONT_SIZE)
+            self.text = [self.font.render(line, True, (255, 255, 255), (0, 0, 0)) for line in self.lines()]
+        x, y = position
+        blits = []
+        for surface in self.text:
+            blits.append((surface, (x, y)))
+            y += surface.get_height()
+        return blits
+
+    # Finishes and closes the dump file, JSON files get the rolling summary at the end
+    def dump(self):
+        if self.file is None:
+            return
+        if self.writer is None:
+            self.file.write('\n], "summary": ' + json.dumps(self.stats(), indent=1) + "}\n")
+        self.file.close()
+        self.file = None
+        self.writer = None
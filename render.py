@@ -0,0 +1,45 @@
+import pygame
+
+# Draws a frame with one Surface.blits call per layer.
+# Static layers (background, buildings, minerals) are composed onto their own surface and only redrawn
+# when the camera moves or they change. Otherwise only the areas dynamic objects covered last frame
+# or cover now are pushed to the display.
+class Renderer:
+    # Past this many changed areas it's quicker to push the whole screen
+    MAX_DIRTY_RECTS = 128
+
+    def __init__(self, screen: pygame.Surface):
+        self.screen = screen
+        self.static = pygame.Surface(screen.get_size()).convert()
+        # What the static surface was last drawn from
+        self.static_blits = None
+        # Areas the dynamic layers covered on the last frame
+        self.dirty: list[pygame.Rect] = []
+
+    # Both arguments are lists of (surface, screen position) pairs, in drawing order
+    def present(self, static_blits: list, dynamic_blits: list):
+        if static_blits != self.static_blits:
+            self.static.fill((0, 0, 0))
+            self.static.blits(static_blits, doreturn=False)
+            self.static_blits = static_blits
+            self.screen.blit(self.static, (0, 0))
+            self.dirty = self.screen.blits(dynamic_blits)
+            pygame.display.update()
+            return
+
+        # With lots of dynamic objects, repainting the whole static surface at once is cheaper
+        if len(self.dirty) > self.MAX_DIRTY_RECTS:
+            self.screen.blit(self.static, (0, 0))
+            self.dirty = self.screen.blits(dynamic_blits)
+            pygame.display.update()
+            return
+
+        # Paint the static layers back over where dynamic objects were, then draw them where they are now
+        self.screen.blits([(self.static, rect, rect) for rect in self.dirty], doreturn=False)
+        drawn = self.screen.blits(dynamic_blits)
+        changed = self.dirty + drawn
+        self.dirty = drawn
+        if len(changed) > self.MAX_DIRTY_RECTS:
+            pygame.display.update()
+        else:
+            pygame.display.update(changed)
@@ -0,0 +1,64 @@
+import manager
+
+# Decides how often play.py sends the game and how much goes in each frame.
+# The rate goes up with how much is changing, down when the connection is slow or backed up,
+# and a frame never carries more than the budget, with changes near the other player's camera sent first.
+class SendScheduler:
+    MIN_RATE = 2          # Frames per second when nothing is happening, keeps acks flowing
+    MAX_RATE = 30         # Frames per second during big fights
+    BASE_RATE = 10        # What the game used to send at all the time
+    CHANGES_PER_HZ = 4    # Every this many changed objects adds one frame per second
+    TARGET_RTT = 0.15     # Above this round trip time the rate is scaled down
+    HIGH_WATER = 64 * 1024    # Bytes waiting to be sent before we back off
+    LOW_WATER = 16 * 1024     # Bytes waiting below which we can speed up again
+    MAX_RECORDS = 256         # Most changed objects in one frame when the connection is clear
+    MIN_RECORDS = 16          # Most changed objects in one frame when it's backed up
+
+    def __init__(self, connection, player: str):
+        self.connection = connection
+        self.player = player
+        self.rate = self.BASE_RATE
+        # Highest rate the connection currently allows, halved when it backs up and grown back slowly
+        self.ceiling = self.MAX_RATE
+        self.budget = self.MAX_RECORDS
+        self.queue_depth = 0
+        self.buffered_bytes = 0
+
+    # Sends one frame and returns how long to wait before the next one
+    def send(self) -> float:
+        # Anything that changed since the last send is coalesced into this frame
+        self.connection.send(manager.game_to_data(self.player, limit=self.budget))
+        self.update()
+        return 1 / self.rate
+
+    # Works out the next rate and frame budget from the latest measurements
+    def update(self):
+        self.queue_depth = getattr(self.connection, "queue_depth", lambda: 0)()
+        self.buffered_bytes = getattr(self.connection, "buffered_bytes", lambda: 0)()
+
+        if self.buffered_bytes > self.HIGH_WATER:
+            self.ceiling = max(self.MIN_RATE, self.ceiling / 2)
+            self.budget = max(self.MIN_RECORDS, self.budget // 2)
+        elif self.buffered_bytes < self.LOW_WATER:
+            self.ceiling = min(self.MAX_RATE, self.ceiling + 1)
+            self.budget = min(self.MAX_RECORDS, self.budget + self.MIN_RECORDS)
+
+        # Changes that didn't fit in the last frame still count as waiting to go out
+        wanted = self.MIN_RATE + manager.pending_changes / self.CHANGES_PER_HZ
+        if manager.rtt > self.TARGET_RTT:
+            wanted *= max(0.5, self.TARGET_RTT / manager.rtt)
+        # Move halfway to the new rate each frame so one busy frame doesn't cause a burst
+        target = max(self.MIN_RATE, min(self.ceiling, wanted))
+        self.rate = max(self.MIN_RATE, min(self.ceiling, (self.rate + target) / 2))
+
+    # Everything needed to keep an eye on the scheduler
+    def stats(self) -> dict:
+        return {
+            "rate": self.rate,
+            "budget": self.budget,
+            "queue_depth": self.queue_depth,
+            "buffered_bytes": self.buffered_bytes,
+            "rtt": manager.rtt,
+            "pending_changes": manager.pending_changes,
+            "deferred_changes": manager.deferred_changes,
+        }
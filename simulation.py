@@ -0,0 +1,549 @@
+import pygame
+import assets
+import random
+import sys
+import time
+from itertools import count
+from math import hypot
+
+# Hands out a unique id to every game object so it can be tracked across network frames
+object_ids = count(1)
+
+# The simulation steps this many times a second no matter how fast frames are drawn
+STEPS_PER_SECOND = 30
+STEP = 1 / STEPS_PER_SECOND
+# Speeds are in pixels per 1/60th of a second, which is what a frame used to be, so they're scaled to a step
+SPEED_SCALE = 60 / STEPS_PER_SECOND
+
+# A 2D vector without a __dict__. The length is worked out when it's asked for, and the
+# methods ending in _ change the vector in place so hot loops don't make new objects.
+class Vector2:
+    __slots__ = ("x", "y")
+
+    def __init__(self, x: float, y: float):
+        self.x = x
+        self.y = y
+
+    @property
+    def length(self) -> float:
+        return hypot(self.x, self.y)
+
+    def distance_to(self, other) -> float:
+        return hypot(self.x - other.x, self.y - other.y)
+
+    def normalize(self):
+        length = self.length
+        return Vector2(self.x / length, self.y / length) if length > 0 else Vector2(0, 0)
+
+    def normalize_(self):
+        length = self.length
+        if length > 0:
+            self.x /= length
+            self.y /= length
+        else:
+            self.x = self.y = 0
+        return self
+
+    def scale_(self, num: float):
+        self.x *= num
+        self.y *= num
+        return self
+
+    def __iter__(self):
+        yield self.x
+        yield self.y
+
+    def __mul__(self, num: float):
+        return Vector2(self.x * num, self.y * num)
+
+    def __add__(self, other):
+        return Vector2(self.x + other.x, self.y + other.y)
+
+    def __iadd__(self, other):
+        self.x += other.x
+        self.y += other.y
+        return self
+
+    def __sub__(self, other):
+        return Vector2(self.x - other.x, self.y - other.y)
+
+    def __str__(self):
+        return f"({self.x}, {self.y})"
+
+    __rmul__ = __mul__
+
+class GameObject:
+    def __init__(self, sprite: str, position: tuple | Vector2, owner: int = 0, size: Vector2 | None = None):
+        self.id = next(object_ids)
+        self.sprite = sprite
+        if isinstance(position, tuple):
+            self.position = Vector2(position[0], position[1])
+        else:
+            self.position = position
+        self.owner = owner
+        # The size is read from the image file, the image itself is only decoded once something draws it
+        self.rect = pygame.Rect(tuple(self.position), assets.image_size(self.sprite))
+        # The size the sprite is drawn at, None for the image's own size
+        self.surf_size = None
+        self.loaded_surf = None
+        if size is not None:
+            self.size = size
+        else:
+            self.size = Vector2(*self.rect.size)
+        # Set for objects controlled over the network, which are moved by it instead of simulated here
+        self.interpolation = None
+        # The spatial grid this object is in, kept up to date whenever the object moves
+        self.grid = None
+        # Where the object was before the last simulation step, so drawing can blend between steps
+        self.prev_position = None
+
+    # Moves the rect to the current position and tells the grid about it
+    def moved(self):
+        self.rect.topleft = (self.position.x, self.position.y)
+        if self.grid is not None:
+            self.grid.update(self)
+    
+    # The surface to draw, loaded the first time it's needed so a headless game never makes one
+    @property
+    def surf(self) -> pygame.Surface:
+        if self.loaded_surf is None:
+            self.loaded_surf = assets.get_image(self.sprite, self.surf_size)
+        return self.loaded_surf
+
+    def render(self, camera, screen):
+        screen.blit(*self.blit_args(camera))
+
+    # The surface and screen position to draw this object at, for batching into Surface.blits.
+    # alpha is how far we are between the last simulation step and the next one.
+    def blit_args(self, camera, alpha: float = 1.0):
+        rect = self.draw_rect(alpha)
+        return (self.surf, (rect.x - camera.x, rect.y - camera.y))
+
+    # The rect the object is drawn at, part way between where it was and where it is now
+    def draw_rect(self, alpha: float = 1.0) -> pygame.Rect:
+        if self.prev_position is None or alpha >= 1:
+            return self.rect
+        prev_x, prev_y = self.prev_position
+        if prev_x == self.position.x and prev_y == self.position.y:
+            return self.rect
+        x = prev_x + (self.position.x - prev_x) * alpha
+        y = prev_y + (self.position.y - prev_y) * alpha
+        return pygame.Rect((x, y), self.rect.size)
+    
+    def scale(self, factor: tuple):
+        self.resize((int(self.rect.width * factor[0]), int(self.rect.height * factor[1])))
+
+    def resize(self, size: tuple):
+        self.surf_size = (int(size[0]), int(size[1]))
+        self.loaded_surf = None
+        self.size = Vector2(*self.surf_size)
+        self.rect.size = self.surf_size
+
+class Indicator(GameObject):
+    def __init__(self, sprite: str, position: tuple = (0, 0)):
+        super().__init__(sprite, position)
+
+class Mineral(GameObject):
+    def __init__(self, sprite: str, position: tuple, crystal_limit: int):
+        super().__init__(sprite, position)
+        self.crystal_limit = crystal_limit
+
+class Building(GameObject):
+    def __init__(self, sprite: str, position: tuple, max_health: int):
+        super().__init__(sprite, position)
+        self.max_health = max_health
+        self.health = max_health
+
+class Troop(GameObject):
+    # Set on troops that an entity store moves in bulk instead of through move()
+    vectorized = False
+
+    def __init__(self, sprite: str, position: tuple, max_health: int, speed: int, damage: int, sight_range: int = 250, shot_cooldown: int = 1):
+        super().__init__(sprite, position)
+        self.max_health = max_health
+        self.health = max_health
+        self.speed = speed
+        self.damage = damage
+        self.velocity = Vector2(0, 0)
+        self.target: Vector2 | None = None
+        self.enemy_target: Troop | None = None
+        self.sight_range = sight_range
+        self.shot_cooldown = shot_cooldown
+        # Simulation time of the last shot, so the first one can go straight away
+        self.time_since_shot = float("-inf")
+
+    def stop(self):
+        self.velocity.x = self.velocity.y = 0
+
+    # One simulation step. now is the simulation time, bullets is where this troop's shots go
+    # and enemy_troops is what it can destroy.
+    def move(self, now: float, bullets: list, enemy_troops: list):
+        # Enemy targeting
+        if self.enemy_target:
+            distance_to_enemy = self.position.distance_to(self.enemy_target.position)
+            if distance_to_enemy <= self.sight_range:
+                if now - self.time_since_shot > self.shot_cooldown:
+                    self.projectile(bullets)
+                    self.time_since_shot = now
+                self.stop()
+                self.target = None
+            else:
+                self.target = self.enemy_target.position
+
+            if self.enemy_target.health <= 0:
+                self.enemy_target = None
+
+        if self.target:
+            if isinstance(self.target, Building):
+                target_position = self.target.position
+            else:
+                target_position = self.target
+            distance_to_target = self.position.distance_to(target_position)
+            if distance_to_target <= self.speed * SPEED_SCALE:
+                # Close enough to get there this step
+                self.stop()
+                self.position.x, self.position.y = target_position.x, target_position.y
+            else:
+                self.goto(target_position)
+            self.position += self.velocity
+            self.moved()
+
+    def goto(self, position: Vector2):
+        direction = Vector2(position.x - self.position.x, position.y - self.position.y)
+        self.velocity = direction.normalize_().scale_(self.speed * SPEED_SCALE)
+
+    def projectile(self, bullets: list):
+        bullet = projectiles.acquire(self.position, self.damage, self.enemy_target)
+        add_bullet(bullets, bullet)
+
+class Collector(Troop):
+    def __init__(self, sprite: str, position: tuple, max_health: int, speed: int, damage: int, command_center: Building, mineral_target: Mineral, collect_duration=4, collection_amount=10, **kwargs):
+        super().__init__(sprite, position, max_health, speed, damage, **kwargs)
+        self.state = "idle"
+        self.manual_override = False
+        self.manual_target = None
+        self.timer = 0
+        self.command_center = command_center  # Where the collector returns.
+        self.mineral_target = mineral_target  # The mineral to mine.
+        self.collect_duration = collect_duration  # Seconds to wait at the mineral.
+        self.collection_amount = collection_amount  # Amount collected each cycle.
+
+    def update(self, now: float):
+        self.target = self.manual_target
+        if self.position.distance_to(self.manual_target) < 5:
+            self.manual_override = False
+            self.state = "idle"
+            return
+
+        if self.state == "idle":
+            self.stop()
+
+        elif self.state == "to_mineral":
+            self.target = self.mineral_target.position
+            if self.rect.colliderect(self.mineral_target.rect):
+                self.state = "collecting"
+                self.timer = now + self.collect_duration
+                self.stop()
+        elif self.state == "collecting":
+            if now >= self.timer:
+                # Collect resources:
+                self.mineral_target.crystal_limit -= self.collection_amount
+                if self.mineral_target.crystal_limit < 0:
+                    self.mineral_target.crystal_limit = 0
+                # Now return to command center.
+                self.state = "to_command"
+                self.target = self.command_center.position
+        elif self.state == "to_command":
+            self.target = self.command_center.position
+            if self.rect.colliderect(self.command_center.rect):
+                if self.mineral_target.crystal_limit > 0:
+                    # Resume mining if resource is still available.
+                    self.state = "to_mineral"
+                else:
+                    self.state = "idle"
+                    self.target = None
+
+        if self.target:
+            self.goto(self.target)
+            self.position += self.velocity
+            self.moved()
+
+    def __init__(self, sprite: str, position: tuple, max_health: int, speed: int, damage: int, command_center: Building, mineral_target: Mineral, collect_duration=4, collection_amount=10, **kwargs):
+        super().__init__(sprite, position, max_health, speed, damage, **kwargs)
+        self.state = "idle"
+        self.timer = 0
+        self.command_center = command_center
+        self.mineral_target = mineral_target
+        self.collect_duration = collect_duration
+        self.collection_amount = collection_amount
+
+    def update(self, now: float):
+        if self.state == "idle":
+            self.mineral_target = None
+
+        elif self.state == "to_mineral":
+            self.target = self.mineral_target.position
+            if self.rect.colliderect(self.mineral_target.rect):
+                self.state = "collecting"
+                self.timer = now + self.collect_duration
+                self.stop()
+        
+        elif self.state == "collecting":
+            # Wait until 4 seconds have passed.
+            if now >= self.timer:
+                # Deduct the collected amount from the mineral.
+                self.mineral_target.crystal_limit -= self.collection_amount
+                if self.mineral_target.crystal_limit < 0:
+                    self.mineral_target.crystal_limit = 0
+                # Switch state: now return to the command center.
+                self.state = "to_command"
+                self.target = self.command_center.position
+        
+        elif self.state == "to_command":
+            # Move toward the command center.
+            if self.rect.colliderect(self.command_center.rect):
+                # Arrived at the command center.
+                if self.mineral_target.crystal_limit > 0:
+                    self.state = "to_mineral"
+                else:
+                    self.state = "idle"
+                    self.target = None
+
+        # Update movement based on the target.
+        if self.target:
+            self.goto(self.target)
+            self.position += self.velocity
+            self.moved()
+
+# A bullet. They're made far more often than anything else, so they're kept in a pool and reused
+# instead of being built like a Troop for every shot.
+class Projectile(GameObject):
+    SPRITE = "imgs/b1.png"
+    SPEED = 50
+    SCALE = .5
+    vectorized = False
+
+    def __init__(self, sprite: str = SPRITE, position: tuple = (0, 0), speed: float = SPEED, damage: int = 0):
+        super().__init__(sprite, position)
+        if sprite == self.SPRITE:
+            self.scale((self.SCALE, self.SCALE))
+        self.speed = speed
+        self.damage = damage
+        self.velocity = Vector2(0, 0)
+        self.enemy_target = None
+        # Where the bullet is headed, the target's last position once the target is gone
+        self.destination = Vector2(position[0], position[1])
+        # Where the bullet is in its list, so taking it out doesn't have to search for it
+        self.index = -1
+        # Only bullets the pool made go back to it, ones built from the network belong to the other player
+        self.pooled = False
+
+    # Every bullet with the default sprite draws the same surface
+    @property
+    def surf(self) -> pygame.Surface:
+        if self.sprite != self.SPRITE:
+            return super().surf
+        if Projectile.shared_surf is None:
+            Projectile.shared_surf = assets.get_image(self.sprite, self.surf_size)
+        return Projectile.shared_surf
+
+    shared_surf = None
+
+    # Gets a bullet from the pool ready to be fired again
+    def reset(self, position: Vector2, damage: int, enemy_target):
+        self.id = next(object_ids)
+        self.position.x, self.position.y = position.x, position.y
+        self.destination.x, self.destination.y = position.x, position.y
+        self.velocity.x = self.velocity.y = 0
+        self.speed = self.SPEED
+        self.damage = damage
+        self.enemy_target = enemy_target
+        self.interpolation = None
+        self.prev_position = None
+        self.rect.topleft = (position.x, position.y)
+
+    # Flies at the target and damages it on contact. A bullet whose target is gone
+    # carries on to where it last saw it and is then used up.
+    def move(self, now: float, bullets: list, enemy_troops: list):
+        target = self.enemy_target
+        if target is not None:
+            if self.rect.colliderect(target.rect):
+                if target.health > 0:
+                    target.health -= self.damage
+                # Several bullets can land in the same step, only the first one removes the target
+                if target.health <= 0 and target in enemy_troops:
+                    enemy_troops.remove(target)
+                remove_bullet(bullets, self)
+                return
+            if target.health <= 0:
+                self.enemy_target = None
+            else:
+                self.destination.x, self.destination.y = target.position.x, target.position.y
+
+        step_length = self.speed * SPEED_SCALE
+        if self.position.distance_to(self.destination) <= step_length:
+            self.position.x, self.position.y = self.destination.x, self.destination.y
+            if self.enemy_target is None:
+                remove_bullet(bullets, self)
+                return
+        else:
+            self.velocity.x = self.destination.x - self.position.x
+            self.velocity.y = self.destination.y - self.position.y
+            self.position += self.velocity.normalize_().scale_(step_length)
+        self.moved()
+
+# Keeps spare bullets so firing doesn't build new objects and hits don't leave garbage behind
+class ProjectilePool:
+    def __init__(self, size: int = 0):
+        self.free: list[Projectile] = []
+        self.reserve(size)
+
+    # Makes sure at least count bullets are waiting in the pool
+    def reserve(self, count: int):
+        while len(self.free) < count:
+            self.free.append(self.new())
+
+    def new(self) -> Projectile:
+        bullet = Projectile()
+        bullet.pooled = True
+        return bullet
+
+    def acquire(self, position: Vector2, damage: int, enemy_target) -> Projectile:
+        bullet = self.free.pop() if self.free else self.new()
+        bullet.reset(position, damage, enemy_target)
+        return bullet
+
+    def release(self, bullet: Projectile):
+        bullet.enemy_target = None
+        self.free.append(bullet)
+
+projectiles = ProjectilePool()
+
+def add_bullet(bullets: list, bullet: Projectile):
+    bullet.index = len(bullets)
+    bullets.append(bullet)
+
+# Takes a bullet out of its list by moving the last bullet into its place, and gives it back to the pool
+def remove_bullet(bullets: list, bullet: Projectile):
+    index = bullet.index
+    # Lists rebuilt from the network don't keep the indexes up to date
+    if not (0 <= index < len(bullets) and bullets[index] is bullet):
+        index = bullets.index(bullet)
+    last = bullets.pop()
+    if last is not bullet:
+        bullets[index] = last
+        last.index = index
+    bullet.index = -1
+    if isinstance(bullet, Projectile) and bullet.pooled:
+        projectiles.release(bullet)
+
+# The game's rules, stepped at a fixed rate. It only needs the game's lists, so it runs the same
+# with the renderer attached or on its own as fast as the machine allows.
+# With an entity_store.EntityStore, troops made through new_troop are stepped by it in bulk.
+class Simulation:
+    def __init__(self, game: dict, player: str, store=None):
+        self.game = game
+        self.player = player
+        self.other_player = "p2" if player == "p1" else "p1"
+        self.store = store
+        projectiles.reserve(256)
+        # Seconds of simulation run so far, cooldowns and timers use this instead of the wall clock
+        self.time = 0.0
+        self.steps = 0
+
+    # Runs the simulation forward by one fixed step
+    def step(self):
+        troops = self.game[f"{self.player}_troops"]
+        enemy_troops = self.game[f"{self.other_player}_troops"]
+        bullets = self.game[f"{self.player}_bullets"]
+        enemy_bullets = self.game[f"{self.other_player}_bullets"]
+        # Objects moved over the network are left alone
+        for objects in (troops, enemy_troops, bullets, enemy_bullets):
+            for obj in objects:
+                if obj.interpolation is None and not obj.vectorized:
+                    obj.prev_position = (obj.position.x, obj.position.y)
+        if self.store is not None:
+            self.store.step(self.time, self.game)
+        for enemy in list(enemy_troops):
+            if enemy.interpolation is None and not enemy.vectorized:
+                enemy.move(self.time, enemy_bullets, troops)
+        for troop in list(troops):
+            if isinstance(troop, Collector):
+                troop.update(self.time)
+            if not troop.vectorized:
+                troop.move(self.time, bullets, enemy_troops)
+        for bullet in list(bullets):
+            if bullet.interpolation is None and not bullet.vectorized:
+                bullet.move(self.time, bullets, enemy_troops)
+        for bullet in list(enemy_bullets):
+            if bullet.interpolation is None and not bullet.vectorized:
+                bullet.move(self.time, enemy_bullets, troops)
+        self.time += STEP
+        self.steps += 1
+
+    def run(self, steps: int):
+        for _ in range(steps):
+            self.step()
+
+    # Makes a troop for a player, kept in the entity store when there is one
+    def new_troop(self, player: str, sprite: str, position: tuple, max_health: int, speed: int, damage: int, **kwargs) -> Troop:
+        if self.store is not None:
+            from entity_store import TroopProxy
+            return TroopProxy(self.store, player, sprite, position, max_health, speed, damage, **kwargs)
+        return Troop(sprite, position, max_health, speed, damage, **kwargs)
+
+# The two sides of a game, in the order their lists are named and sent over the network
+PLAYERS = ("p1", "p2")
+
+# Played as by someone watching the game. Both sides' lists come from the network and nothing is simulated locally.
+SPECTATOR = "spectator"
+
+def new_game() -> dict:
+    return {
+        "p1_troops": [],
+        "p2_troops": [],
+        "p1_bullets": [],
+        "p2_bullets": [],
+        "p1_buildings": [],
+        "p2_buildings": []
+    }
+
+# Sets up a fight between two squads, each troop going after the one across from it
+def skirmish(simulation: Simulation, squad_size: int):
+    game = simulation.game
+    for i in range(squad_size):
+        troop = simulation.new_troop("p1", 'imgs/red_soildger.png', (100, 100 + i * 60), 150, 10, random.randint(30, 40))
+        troop.scale((.25, .25))
+        game["p1_troops"].append(troop)
+        enemy = simulation.new_troop("p2", 'imgs/blue_tank.png', (1500, 100 + i * 60), 60, 10, random.randint(150, 180))
+        enemy.scale((.2, .2))
+        game["p2_troops"].append(enemy)
+    for troop, enemy in zip(game["p1_troops"], game["p2_troops"]):
+        troop.enemy_target = enemy
+        enemy.enemy_target = troop
+
+# Runs a fight without a display and reports how much faster than real time it went.
+# vectorized steps the troops with NumPy arrays through entity_store.
+def run_headless(seconds: float = 60, squad_size: int = 20, vectorized: bool = False):
+    game = new_game()
+    store = None
+    if vectorized:
+        from entity_store import EntityStore
+        store = EntityStore()
+    simulation = Simulation(game, "p1", store)
+    skirmish(simulation, squad_size)
+    start = time.perf_counter()
+    simulation.run(int(seconds * STEPS_PER_SECOND))
+    elapsed = time.perf_counter() - start
+    print(f"Simulated {simulation.time:.0f} s in {elapsed:.2f} s, {simulation.time / elapsed:.0f}x real time")
+    print(f"p1 troops left: {len(game['p1_troops'])}, p2 troops left: {len(game['p2_troops'])}")
+    return game
+
+# python simulation.py [seconds] [squad size] [--numpy]
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--numpy"]
+    run_headless(
+        float(args[0]) if args else 60,
+        int(args[1]) if len(args) > 1 else 20,
+        "--numpy" in sys.argv
+    )
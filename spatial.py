@@ -0,0 +1,74 @@
+import pygame
+
+# A uniform grid over the world. Each object is stored in every cell its rect touches,
+# so finding what's in an area only looks at the cells under that area.
+class SpatialGrid:
+    def __init__(self, cell_size: int = 256):
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], set] = {}
+        # The range of cells each object is in, as (left, top, right, bottom) cell coordinates
+        self.ranges: dict[object, tuple[int, int, int, int]] = {}
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def __contains__(self, obj):
+        return obj in self.ranges
+
+    def cell_range(self, rect: pygame.Rect) -> tuple[int, int, int, int]:
+        size = self.cell_size
+        return (int(rect.left // size), int(rect.top // size), int((rect.right - 1) // size), int((rect.bottom - 1) // size))
+
+    def insert(self, obj):
+        cell_range = self.ranges[obj] = self.cell_range(obj.rect)
+        left, top, right, bottom = cell_range
+        for x in range(left, right + 1):
+            for y in range(top, bottom + 1):
+                self.cells.setdefault((x, y), set()).add(obj)
+        obj.grid = self
+
+    def remove(self, obj):
+        left, top, right, bottom = self.ranges.pop(obj)
+        for x in range(left, right + 1):
+            for y in range(top, bottom + 1):
+                cell = self.cells[(x, y)]
+                cell.discard(obj)
+                if not cell:
+                    del self.cells[(x, y)]
+        obj.grid = None
+
+    # Moves an object to the cells under its current rect, cheap when it hasn't left its cells
+    def update(self, obj):
+        current = self.ranges.get(obj)
+        if current is not None:
+            if current == self.cell_range(obj.rect):
+                return
+            self.remove(obj)
+        self.insert(obj)
+
+    # Makes the grid hold exactly these objects, wherever they are now
+    def sync(self, objects):
+        for obj in objects:
+            self.update(obj)
+        if len(self.ranges) != len(objects):
+            present = set(objects)
+            for obj in [obj for obj in self.ranges if obj not in present]:
+                self.remove(obj)
+
+    # Every object whose rect overlaps rect, oldest object first so they draw in the order they were made
+    def query(self, rect: pygame.Rect) -> list:
+        left, top, right, bottom = self.cell_range(rect)
+        found = set()
+        for x in range(left, right + 1):
+            for y in range(top, bottom + 1):
+                cell = self.cells.get((x, y))
+                if cell:
+                    found.update(cell)
+        return sorted((obj for obj in found if obj.rect.colliderect(rect)), key=lambda obj: obj.id)
+
+    # Every object whose rect contains the point, only looks at the one cell the point is in
+    def query_point(self, x: float, y: float) -> list:
+        cell = self.cells.get((int(x // self.cell_size), int(y // self.cell_size)))
+        if not cell:
+            return []
+        return sorted((obj for obj in cell if obj.rect.collidepoint(x, y)), key=lambda obj: obj.id)